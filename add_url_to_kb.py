@@ -1,24 +1,22 @@
 import argparse
-import requests
-from bs4 import BeautifulSoup
 import json
 import os
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    print("Error: GOOGLE_API_KEY not found in .env file.")
-    exit(1)
+from faq_generation import FAQGenerator, Page, configure_genai
+from crawl_frontier import CrawlFrontier
 
-genai.configure(api_key=api_key)
+# Load environment variables (Gemini is configured by FAQGenerator, on first use)
+load_dotenv()
 
 DATA_FILE = "data.json"
 MODEL_NAME = "gemini-1.5-flash"
 
 def get_page_text(url):
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         # Verify=False for SVU website certificate issues if needed, strictly speaking we should try verify=True first or warn
         print(f"Fetching {url}...")
@@ -42,33 +40,11 @@ def get_page_text(url):
 
 def generate_faqs(text, url):
     print("Generating FAQs using AI...")
-    model = genai.GenerativeModel(MODEL_NAME)
-    prompt = f"""
-    Analyze the following text scraped from {url}.
-    Extract key facts, dates, names, roles, and procedures.
-    Generate 5 to 10 high-quality Question-Answer pairs (FAQs) based ONLY on this text.
-    Format the output as a JSON array of objects, where each object has "question" and "answer" keys.
-    Do not add any markdown formatting like ```json. just return the raw JSON array.
-    
-    Text:
-    {text}
-    """
-    
-    try:
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-        # Clean markdown if present
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-            
-        return json.loads(content)
-    except Exception as e:
-        print(f"Error generating FAQS: {e}")
-        return []
+    # Same structured, validated generation as the full crawler, for a single page
+    generator = FAQGenerator(MODEL_NAME)
+    for _, faqs in generator.generate([Page(url, text)]):
+        return faqs
+    return []
 
 def update_database(new_faqs, url):
     print(f"Updating {DATA_FILE}...")
@@ -107,6 +83,7 @@ def main():
     parser = argparse.ArgumentParser(description="Scrape a URL and add FAQs to knowledge base.")
     parser.add_argument("url", help="The URL to scrape")
     args = parser.parse_args()
+    configure_genai()
     
     import urllib3
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -118,6 +95,10 @@ def main():
         if faqs:
             print(f"Generated {len(faqs)} FAQs.")
             update_database(faqs, args.url)
+            # Let the crawler keep this page fresh from now on
+            frontier = CrawlFrontier.load("svuniversity.edu.in")
+            if frontier.mark_known(args.url, time.time()):
+                frontier.save()
         else:
             print("No FAQs could be generated from the content.")
     else:
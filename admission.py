@@ -0,0 +1,179 @@
+import asyncio
+import json
+import math
+import os
+import time
+
+# Admission control for the expensive routes (chat, audio). Every request to a
+# guarded route passes three gates, cheapest first:
+#   1. a per-client token bucket for the route      -> 429 + Retry-After
+#   2. the route's own concurrency budget + queue    -> 503 + Retry-After
+#   3. the worker-wide in-flight limit + queue       -> 503 + Retry-After
+# Limits are per worker process; other routes (static files, admin CRUD) are untouched.
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+# Only trust X-Forwarded-For when running behind our own reverse proxies: set to
+# the number of proxy hops in front of the app ("true"/"yes" = 1). Each proxy
+# appends the address it saw, so the client is that many entries from the right;
+# anything further left was sent by the client and is ignored.
+_trust_proxy = os.getenv("ADMISSION_TRUST_PROXY", "").lower()
+ADMISSION_TRUST_PROXY = 1 if _trust_proxy in ("true", "yes") else int(_trust_proxy or 0)
+
+MAX_TRACKED_CLIENTS = 10000
+
+
+class RouteBudget:
+    """Per-route limits: `rate` requests/second per client with `burst`, and `concurrency` in flight."""
+
+    def __init__(self, prefix: str, rate: float, burst: int, concurrency: int, max_queue: int = 0):
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consumes a token. Returns 0 on success, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class ConcurrencyLimit:
+    """Semaphore with a bounded wait queue; acquire() fails fast once the queue is full."""
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._sem = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        if not self._sem.locked():
+            await self._sem.acquire()
+            self.in_flight += 1
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._sem.release()
+
+
+def client_ip(scope) -> str:
+    if ADMISSION_TRUST_PROXY:
+        forwarded = [hop.strip() for name, value in scope.get("headers", []) if name == b"x-forwarded-for"
+                     for hop in value.decode("latin-1").split(",") if hop.strip()]
+        if len(forwarded) >= ADMISSION_TRUST_PROXY:
+            return forwarded[-ADMISSION_TRUST_PROXY]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionControlMiddleware:
+    """
+    Pure ASGI middleware so the slot is held until the response (including
+    streamed bodies) has been fully sent.
+    """
+
+    def __init__(self, app, budgets, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.app = app
+        self.budgets = budgets
+        self.queue_timeout = queue_timeout
+        self.global_limit = ConcurrencyLimit(max_in_flight, max_queue, queue_timeout)
+        self.route_limits = {b.prefix: ConcurrencyLimit(b.concurrency, b.max_queue, queue_timeout) for b in budgets}
+        self.buckets = {}
+
+    def _budget_for(self, path: str):
+        for budget in self.budgets:
+            if path.startswith(budget.prefix):
+                return budget
+        return None
+
+    def _bucket(self, budget, ip):
+        key = (budget.prefix, ip)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_TRACKED_CLIENTS:
+                # Drop buckets that have refilled completely; they carry no state
+                now = time.monotonic()
+                self.buckets = {k: b for k, b in self.buckets.items()
+                                if b.tokens + (now - b.updated) * b.rate < b.capacity}
+            bucket = self.buckets[key] = TokenBucket(budget.rate, budget.burst)
+        return bucket
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        budget = self._budget_for(scope["path"])
+        if budget is None:
+            return await self.app(scope, receive, send)
+
+        retry_after = self._bucket(budget, client_ip(scope)).take()
+        if retry_after:
+            return await reject(send, 429, "Too many requests, please slow down.", retry_after)
+
+        route_limit = self.route_limits[budget.prefix]
+        if not await route_limit.acquire():
+            return await reject(send, 503, "This service is busy, please try again shortly.", self.queue_timeout)
+        try:
+            if not await self.global_limit.acquire():
+                return await reject(send, 503, "Server is busy, please try again shortly.", self.queue_timeout)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.global_limit.release()
+        finally:
+            route_limit.release()
+
+
+async def reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def budget_from_env(name: str, prefix: str, rate_per_minute: float, burst: int, concurrency: int, max_queue: int):
+    # e.g. ADMISSION_CHAT_RATE_PER_MINUTE=30, ADMISSION_CHAT_BURST=10, ADMISSION_CHAT_CONCURRENCY=16
+    return RouteBudget(
+        prefix,
+        rate=float(os.getenv(f"ADMISSION_{name}_RATE_PER_MINUTE", str(rate_per_minute))) / 60.0,
+        burst=int(os.getenv(f"ADMISSION_{name}_BURST", str(burst))),
+        concurrency=int(os.getenv(f"ADMISSION_{name}_CONCURRENCY", str(concurrency))),
+        max_queue=int(os.getenv(f"ADMISSION_{name}_QUEUE", str(max_queue))),
+    )
@@ -1,54 +1,373 @@
+import asyncio
+import hashlib
+import io
 import os
-import tempfile
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import queue
+import re
+import threading
+import time
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from gtts import gTTS
+from starlette.datastructures import UploadFile
+
+from shared_state import atomic_write_bytes
 
 from .config import settings
 
 router = APIRouter()
 
+CHUNK_SIZE = 64 * 1024
+_EOF = object()
 
-@router.post('/speech-to-text')
-async def speech_to_text(file: UploadFile = File(...)):
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=400, detail='OPENAI_API_KEY is required for server-side STT')
 
-    try:
+class UploadTooLarge(Exception):
+    pass
+
+
+class EmptyUpload(Exception):
+    pass
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Blocking file-like view over chunks pushed from the event loop through a bounded
+    queue, so the transcription backend reads the upload while it is still arriving.
+    """
+
+    def __init__(self, chunks: queue.Queue, name: str):
+        self.chunks = chunks
+        self.name = name
+        self._buffer = b""
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._done:
+            item = self.chunks.get()
+            if item is _EOF:
+                self._done = True
+            elif isinstance(item, Exception):
+                self._done = True
+                raise item
+            else:
+                self._buffer = item
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class WhisperBackend:
+    def transcribe(self, audio_file) -> str:
         import openai
         openai.api_key = settings.OPENAI_API_KEY
-        suffix = os.path.splitext(file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            contents = await file.read()
-            tmp.write(contents)
-            tmp.flush()
-            tmp_path = tmp.name
-
-        # Use Whisper via OpenAI
-        with open(tmp_path, 'rb') as audio_file:
-            resp = openai.Audio.transcribe('whisper-1', audio_file)
-        os.unlink(tmp_path)
-        return {"transcript": resp.get('text')}
+        resp = openai.Audio.transcribe('whisper-1', audio_file)
+        return resp.get('text')
+
+
+class LocalBackend:
+    """Offline stand-in: consumes the stream and reports its size instead of calling an API."""
+
+    def transcribe(self, audio_file) -> str:
+        size = 0
+        while True:
+            data = audio_file.read(CHUNK_SIZE)
+            if not data:
+                break
+            size += len(data)
+        return f"[local transcript of {size} bytes]"
+
+
+STT_BACKENDS = {
+    "openai": WhisperBackend,
+    "local": LocalBackend,
+}
+
+
+def get_stt_backend():
+    backend = STT_BACKENDS.get(settings.STT_BACKEND)
+    if backend is None:
+        raise HTTPException(status_code=500, detail=f'Unknown STT_BACKEND {settings.STT_BACKEND!r}')
+    if settings.STT_BACKEND == "openai" and not settings.OPENAI_API_KEY:
+        raise HTTPException(status_code=400, detail='OPENAI_API_KEY is required for server-side STT')
+    return backend()
+
+
+async def _iter_upload(file: UploadFile | None, request: Request):
+    # Multipart uploads are read in chunks; a raw audio/* body is streamed straight off the socket
+    if file is not None:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in request.stream():
+            if chunk:
+                yield chunk
+
+
+def _limited_receive(receive, max_bytes: int):
+    # ASGI receive that fails once the request body passes max_bytes, whoever is reading it
+    received = 0
+
+    async def limited():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise UploadTooLarge()
+        return message
+
+    return limited
+
+
+async def _read_multipart_file(request: Request, max_bytes: int):
+    # Starlette spools a whole multipart body before any handler code sees the file, so
+    # the form is parsed here (not via a File() parameter) over a size-capped receive
+    limited = Request(request.scope, _limited_receive(request.receive, max_bytes))
+    form = await limited.form(max_files=1, max_fields=10)
+    file = form.get('file')
+    if not isinstance(file, UploadFile):
+        await form.close()
+        raise HTTPException(status_code=400, detail="multipart upload needs a 'file' part")
+    return form, file
+
+
+@router.post('/speech-to-text')
+async def speech_to_text(request: Request):
+    """
+    Body: a raw audio/* stream (transcribed while it arrives) or multipart/form-data with
+    a 'file' part (buffered by the form parser, capped at STT_MAX_UPLOAD_BYTES while read).
+    """
+    backend = get_stt_backend()
+    max_bytes = settings.STT_MAX_UPLOAD_BYTES
+
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + CHUNK_SIZE:
+        raise HTTPException(status_code=413, detail=f'Audio upload exceeds {max_bytes} bytes')
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    multipart = content_type == 'multipart/form-data'
+    if not (multipart or content_type.startswith('audio/') or content_type == 'application/octet-stream'):
+        raise HTTPException(status_code=415, detail='Send audio/* or application/octet-stream, or multipart/form-data with a file part')
+    if content_length == '0':
+        raise HTTPException(status_code=400, detail='Empty audio upload')
+
+    form = file = None
+    if multipart:
+        try:
+            # The cap also covers the multipart framing around the file
+            form, file = await _read_multipart_file(request, max_bytes + CHUNK_SIZE)
+        except UploadTooLarge:
+            raise HTTPException(status_code=413, detail=f'Audio upload exceeds {max_bytes} bytes')
+    try:
+        return await _transcribe_upload(backend, request, file, max_bytes)
+    finally:
+        if form is not None:
+            await form.close()
+
+
+async def _transcribe_upload(backend, request: Request, file, max_bytes: int):
+    filename = file.filename if file is not None else 'upload'
+    suffix = os.path.splitext(filename or '')[1] or '.webm'
+    chunks = queue.Queue(maxsize=8)
+    reader = ChunkReader(chunks, name=f'audio{suffix}')
+
+    # Transcription runs in a worker thread while this coroutine feeds it the upload
+    transcription = asyncio.ensure_future(asyncio.to_thread(backend.transcribe, reader))
+    received = 0
+    try:
+        async for chunk in _iter_upload(file, request):
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLarge()
+            if not await _feed(chunks, chunk, transcription):
+                break
+        if not received:
+            raise EmptyUpload()
+        await _feed(chunks, _EOF, transcription)
+        transcript = await asyncio.wait_for(transcription, timeout=settings.STT_TIMEOUT_SECONDS)
+        return {"transcript": transcript}
+    except UploadTooLarge:
+        _abort(chunks, transcription)
+        raise HTTPException(status_code=413, detail=f'Audio upload exceeds {max_bytes} bytes')
+    except EmptyUpload:
+        _abort(chunks, transcription)
+        raise HTTPException(status_code=400, detail='Empty audio upload')
+    except asyncio.TimeoutError:
+        _abort(chunks, transcription)
+        raise HTTPException(status_code=504, detail='Transcription timed out')
     except Exception as e:
+        _abort(chunks, transcription)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post('/text-to-speech')
-async def text_to_speech(text: str):
-    try:
-        tts = gTTS(text=text, lang='en')
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        tmp.close()
-        tts.save(tmp.name)
-
-        def iterfile():
-            with open(tmp.name, 'rb') as f:
-                yield from f
+async def _feed(chunks: queue.Queue, item, transcription) -> bool:
+    # Backpressure without blocking the event loop; False once the backend has stopped reading
+    while not transcription.done():
+        try:
+            chunks.put_nowait(item)
+            return True
+        except queue.Full:
+            await asyncio.sleep(0.005)
+    return False
+
+
+def _abort(chunks: queue.Queue, transcription):
+    # Replace whatever is queued with an error so the reader thread fails fast. Done
+    # even when the task is already finished / cancelled (e.g. by wait_for on timeout):
+    # its thread may still be blocked reading the stream.
+    while True:
+        try:
+            chunks.get_nowait()
+        except queue.Empty:
+            break
+    chunks.put_nowait(UploadTooLarge('upload aborted'))
+    transcription.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+class TTSCache:
+    """
+    Content-addressed MP3 cache on disk, keyed on sha256(lang + text) of each sentence.
+    Shared by all workers; the least recently used files are evicted past max_bytes.
+    Each worker keeps a running estimate of the cache size (its own writes on top of
+    the last scan) and only scans the directory when that estimate crosses max_bytes,
+    or every RESCAN_SECONDS to pick up what other workers wrote. Eviction goes down to
+    LOW_WATER_RATIO of max_bytes, so the next scans are a good number of puts away.
+    """
+
+    RESCAN_SECONDS = 300
+    LOW_WATER_RATIO = 0.9
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._estimated_bytes = None
+        self._scanned_at = 0.0
+
+    def _path(self, text: str, lang: str) -> str:
+        digest = hashlib.sha256(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.mp3")
+
+    def get(self, text: str, lang: str):
+        path = self._path(text, lang)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            pass # evicted by another worker since the read; the bytes are still good
+        return data
+
+    def put(self, text: str, lang: str, data: bytes):
+        atomic_write_bytes(self._path(text, lang), data)
+        with self._lock:
+            stale = self._estimated_bytes is None or time.monotonic() - self._scanned_at > self.RESCAN_SECONDS
+            if not stale:
+                self._estimated_bytes += len(data)
+            if stale or self._estimated_bytes > self.max_bytes:
+                self._estimated_bytes = self._evict()
+                self._scanned_at = time.monotonic()
+
+    def _evict(self) -> int:
+        """Full scan: once past max_bytes, drops least recently used files down to the low-water mark; returns the size left."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.mp3'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return total
+        entries.sort()
+        target = self.max_bytes * self.LOW_WATER_RATIO
+        for _, size, path in entries:
+            if total <= target:
+                break
             try:
-                os.unlink(tmp.name)
-            except Exception:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
                 pass
+        return total
+
+
+_tts_cache = None
+
+
+def get_tts_cache() -> TTSCache:
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_BYTES)
+    return _tts_cache
+
+
+def split_sentences(text: str, max_chars: int = 300):
+    # Sentence-sized pieces so the first one can play while the rest are synthesized;
+    # very short sentences are merged so we don't pay a round trip for "Yes."
+    pieces = []
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        if not sentence:
+            continue
+        if pieces and len(pieces[-1]) + len(sentence) < max_chars and len(pieces[-1]) < 60:
+            pieces[-1] = f"{pieces[-1]} {sentence}"
+        else:
+            pieces.append(sentence)
+    return pieces
+
 
-        return StreamingResponse(iterfile(), media_type='audio/mpeg')
+def synthesize(text: str, lang: str) -> bytes:
+    cache = get_tts_cache()
+    data = cache.get(text, lang)
+    if data is None:
+        from gtts import gTTS
+
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buf)
+        data = buf.getvalue()
+        cache.put(text, lang, data)
+    return data
+
+
+@router.post('/text-to-speech')
+async def text_to_speech(text: str, lang: str = 'en'):
+    sentences = split_sentences(text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail='text is empty')
+
+    # Each sentence is its own MP3 stream; concatenated MP3 frames play back as one clip.
+    # The next sentence is synthesized (off the event loop) while the current one is sent.
+    pending = [asyncio.ensure_future(asyncio.to_thread(synthesize, s, lang)) for s in sentences[:2]]
+    try:
+        first = await pending[0]
     except Exception as e:
+        for task in pending[1:]:
+            task.cancel()
         raise HTTPException(status_code=500, detail=str(e))
+
+    async def iteraudio():
+        current = first
+        try:
+            for i in range(len(sentences)):
+                if i + 2 < len(sentences):
+                    pending.append(asyncio.ensure_future(asyncio.to_thread(synthesize, sentences[i + 2], lang)))
+                if i > 0:
+                    current = await pending[i]
+                yield current
+        except Exception as e:
+            print(f"TTS error mid-stream: {e}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(iteraudio(), media_type='audio/mpeg')
@@ -0,0 +1,219 @@
+import re
+from typing import List
+
+from .config import settings
+
+# Long pages are embedded as overlapping, sentence-aligned chunks instead of one
+# vector per document. Chunks never cross a heading, and each chunk is prefixed
+# with its section heading so the embedding knows what the text is about.
+# Every chunk's metadata maps it back to its document: doc_id, chunk (position),
+# start/end (character offsets of the body in the document) and body_offset
+# (length of the heading prefix), which is what lets retrieval stitch adjacent
+# chunks back together without repeating the overlap.
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+MARKDOWN_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+MAX_HEADING_CHARS = 80
+
+
+def heading_text(line: str):
+    """The heading in `line`, or None if it reads like body text."""
+    match = MARKDOWN_HEADING_RE.match(line)
+    if match:
+        return match.group(1)
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_HEADING_CHARS or stripped[-1] in ".!?,;":
+        return None
+    words = re.findall(r"[A-Za-z][\w'&-]*", stripped)
+    if not words:
+        return None
+    if stripped.endswith(":") or stripped.isupper():
+        return stripped.rstrip(":").strip()
+    # "Hostel Facilities", "Admission Process for PG Courses"
+    capitalized = sum(1 for w in words if w[0].isupper())
+    if len(words) <= 8 and capitalized >= max(1, len(words) - 2) and capitalized / len(words) >= 0.6:
+        return stripped
+    return None
+
+
+def split_sections(text: str):
+    """(heading, start, end) spans; a heading line starts a new section and isn't part of its body."""
+    sections = []
+    heading, start = "", 0
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        found = heading_text(line)
+        if found is not None:
+            if text[start:offset].strip():
+                sections.append((heading, start, offset))
+            heading, start = found, offset + len(line)
+        offset += len(line)
+    if text[start:].strip():
+        sections.append((heading, start, len(text)))
+    return sections
+
+
+def sentence_spans(text: str, start: int, end: int, max_chars: int):
+    """Sentence (and paragraph) spans within text[start:end]; longer ones are split on whitespace."""
+    spans = []
+    body = text[start:end]
+    pieces = re.split(r"(\n\s*\n)", body)
+    position = start
+    for piece in pieces:
+        cursor = 0
+        for match in list(SENTENCE_END_RE.finditer(piece)) + [None]:
+            stop = match.end() if match else len(piece)
+            sentence = piece[cursor:stop]
+            if sentence.strip():
+                spans.extend(_split_long(text, position + cursor, position + stop, max_chars))
+            cursor = stop
+        position += len(piece)
+    return spans
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int):
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + max_chars // 2, start + max_chars)
+        cut = cut + 1 if cut > start else start + max_chars
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+
+def chunk_text(text: str, max_chars: int = None, overlap_chars: int = None):
+    """
+    Splits text into [{"heading", "start", "end"}] chunks of at most max_chars
+    of body text, each starting with up to overlap_chars worth of the previous
+    chunk's trailing sentences.
+    """
+    max_chars = max_chars or settings.CHUNK_MAX_CHARS
+    overlap_chars = settings.CHUNK_OVERLAP_CHARS if overlap_chars is None else overlap_chars
+    chunks = []
+    for heading, sec_start, sec_end in split_sections(text):
+        spans = sentence_spans(text, sec_start, sec_end, max_chars)
+        current = []
+        for span in spans:
+            if current and span[1] - current[0][0] > max_chars:
+                chunks.append({"heading": heading, "start": current[0][0], "end": current[-1][1]})
+                # Carry trailing sentences over as overlap, never the whole chunk
+                carried = []
+                for prev in reversed(current[1:]):
+                    if current[-1][1] - prev[0] > overlap_chars or span[1] - prev[0] > max_chars:
+                        break
+                    carried.insert(0, prev)
+                current = carried
+            current.append(span)
+        if current:
+            chunks.append({"heading": heading, "start": current[0][0], "end": current[-1][1]})
+    return chunks
+
+
+def chunk_document(doc: dict) -> List[dict]:
+    """Vector store entries ({"content", "metadata"}) for one KB document."""
+    content = doc["content"]
+    entries = []
+    for n, chunk in enumerate(chunk_text(content)):
+        heading = chunk["heading"] or doc.get("title") or ""
+        prefix = f"{heading}\n" if heading else ""
+        raw = content[chunk["start"]:chunk["end"]]
+        body = raw.strip()
+        leading = len(raw) - len(raw.lstrip())
+        entries.append({
+            "content": prefix + body,
+            "metadata": {
+                "doc_id": doc["doc_id"],
+                "title": doc.get("title"),
+                "tags": doc.get("tags"),
+                "chunk": n,
+                "heading": chunk["heading"],
+                "start": chunk["start"] + leading,
+                "end": chunk["start"] + leading + len(body),
+                "body_offset": len(prefix),
+            },
+        })
+    if not entries:
+        # Empty content still gets a title-only entry, so the document is in the index
+        # and check_consistency doesn't report it as missing forever
+        title = doc.get("title") or doc["doc_id"]
+        entries.append({
+            "content": title,
+            "metadata": {
+                "doc_id": doc["doc_id"],
+                "title": doc.get("title"),
+                "tags": doc.get("tags"),
+                "chunk": 0,
+                "heading": None,
+                "start": 0,
+                "end": 0,
+                "body_offset": len(title),
+            },
+        })
+    return entries
+
+
+def _body(result):
+    return result.page_content[result.metadata.get("body_offset", 0):]
+
+
+def merge_chunks(results, max_chars: int = None):
+    """
+    Turns retrieved chunks into passages: chunks of the same document are put back
+    in order, consecutive ones are joined without their overlap, and passages are
+    kept in the rank of their best chunk until max_chars of context is used.
+    """
+    max_chars = max_chars or settings.QUERY_CONTEXT_MAX_CHARS
+    by_doc = {}
+    for rank, r in enumerate(results):
+        by_doc.setdefault(r.metadata.get("doc_id"), []).append((rank, r))
+
+    passages = []
+    for doc_id, ranked in by_doc.items():
+        ordered = sorted(ranked, key=lambda item: item[1].metadata.get("chunk", 0))
+        runs = [[ordered[0]]]
+        for item in ordered[1:]:
+            if item[1].metadata.get("chunk", 0) == runs[-1][-1][1].metadata.get("chunk", 0) + 1:
+                runs[-1].append(item)
+            else:
+                runs.append([item])
+        for run in runs:
+            chunks = [r for _, r in run]
+            text = chunks[0].page_content
+            for prev, r in zip(chunks, chunks[1:]):
+                if r.metadata.get("heading") != prev.metadata.get("heading"):
+                    text += "\n\n" + r.page_content
+                else:
+                    overlap = max(0, prev.metadata.get("end", 0) - r.metadata.get("start", 0))
+                    text += " " + _body(r)[overlap:].lstrip()
+            passages.append((min(rank for rank, _ in run), {
+                "content": text.strip(),
+                "metadata": {
+                    "doc_id": doc_id,
+                    "title": chunks[0].metadata.get("title"),
+                    "tags": chunks[0].metadata.get("tags"),
+                    "chunks": [r.metadata.get("chunk") for r in chunks],
+                },
+            }))
+
+    passages.sort(key=lambda p: p[0])
+    context, used = [], 0
+    for _, passage in passages:
+        remaining = max_chars - used
+        if remaining <= 0:
+            break
+        if len(passage["content"]) > remaining:
+            # Cut at the last sentence end that fits, else the last word boundary;
+            # a passage with neither is skipped and the next one may still fit
+            cut = passage["content"][:remaining]
+            stop = max(cut.rfind(". "), cut.rfind(".\n"))
+            if stop > 0:
+                cut = cut[:stop + 1]
+            elif cut.rfind(" ") > 0:
+                cut = cut[:cut.rfind(" ")].rstrip()
+            else:
+                continue
+            passage["content"] = cut
+        context.append(passage)
+        used += len(passage["content"])
+    return context
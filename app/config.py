@@ -4,9 +4,35 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     MONGO_URI: str = "mongodb://mongodb:27017"
     MONGO_DB: str = "campus_kb"
+    # "mongo" (Motor, async) or "memory" (in-process stand-in for tests/dev)
+    KB_STORE_BACKEND: str = "mongo"
+    # Connection pool per worker process
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 60000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
     OPENAI_API_KEY: str | None = None
     EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
     VECTORSTORE_PATH: str = "vector_store/faiss_index"
+    # Tombstoned (replaced / deleted) vectors are removed once there are at least this
+    # many and they make up this share of the index; checked every interval seconds
+    VECTORSTORE_COMPACT_MIN_TOMBSTONES: int = 64
+    VECTORSTORE_COMPACT_RATIO: float = 0.2
+    VECTORSTORE_COMPACT_INTERVAL_SECONDS: float = 300
+    # Documents are embedded as chunks of at most CHUNK_MAX_CHARS, overlapping by up to
+    # CHUNK_OVERLAP_CHARS; /query merges the retrieved chunks into at most QUERY_CONTEXT_MAX_CHARS
+    CHUNK_MAX_CHARS: int = 800
+    CHUNK_OVERLAP_CHARS: int = 150
+    QUERY_CONTEXT_MAX_CHARS: int = 4000
+    # Speech-to-text: "openai" (Whisper) or "local" (offline stand-in for tests/dev)
+    STT_BACKEND: str = "openai"
+    STT_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    STT_TIMEOUT_SECONDS: float = 120
+    # Text-to-speech MP3 cache shared by all workers
+    TTS_CACHE_DIR: str = "tts_cache"
+    TTS_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
 
     class Config:
         env_file = ".env"
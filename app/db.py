@@ -1,6 +1,160 @@
-from pymongo import MongoClient
+from typing import Iterable, List
+
 from .config import settings
 
-client = MongoClient(settings.MONGO_URI)
-db = client[settings.MONGO_DB]
-kb_collection = db.kb_documents
+# KB document store for the app/ service. Routes await it directly instead of
+# tying up threadpool slots with blocking pymongo calls:
+#   - "mongo": Motor (async pymongo) with an explicitly sized connection pool,
+#     opened / closed by the app lifespan, writes batched into one bulk_write
+#   - "memory": dict-backed stand-in with the same interface, for tests and local dev
+# Both keep doc_id unique; Mongo also gets indexes on doc_id and tags.
+
+
+class KBWriteError(Exception):
+    """Some documents of a batch could not be written; the rest were."""
+
+    def __init__(self, failed: List[dict], written: int):
+        super().__init__(f"{len(failed)} documents could not be written")
+        self.failed = failed # [{"doc_id", "error"}]
+        self.written = written
+
+
+class MongoKBStore:
+    def __init__(self):
+        self.client = None
+        self.collection = None
+
+    async def connect(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        # Retried by the readiness warm-up until Mongo answers; keep the same pool across attempts
+        if self.client is None:
+            self.client = AsyncIOMotorClient(
+                settings.MONGO_URI,
+                maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+            )
+            self.collection = self.client[settings.MONGO_DB].kb_documents
+        await self.ensure_indexes()
+
+    async def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.collection = None
+
+    async def ensure_indexes(self):
+        # create_index is a no-op when the index already exists, so every worker can run it
+        await self.collection.create_index("doc_id", unique=True, name="doc_id_unique")
+        await self.collection.create_index("tags", name="tags")
+
+    async def upsert_documents(self, docs: List[dict]) -> int:
+        """
+        Returns how many documents were inserted or changed. Raises KBWriteError (after
+        writing everything else) for documents that still fail.
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        if not docs:
+            return 0
+        # One round trip for the whole batch; unordered so one bad document doesn't stop the rest
+        ops = [UpdateOne({"doc_id": d["doc_id"]}, {"$set": d}, upsert=True) for d in docs]
+        pending = list(range(len(docs)))
+        written = 0
+        failed = []
+        # Two workers upserting the same new doc_id race on the unique index: one gets a
+        # duplicate key error, and retrying it finds the document and updates it instead
+        for attempt in range(2):
+            try:
+                result = await self.collection.bulk_write([ops[i] for i in pending], ordered=False)
+                written += result.upserted_count + result.modified_count
+                break
+            except BulkWriteError as e:
+                details = e.details
+                written += details.get("nUpserted", 0) + details.get("nModified", 0)
+                errors = details.get("writeErrors", [])
+                retry = [pending[err["index"]] for err in errors if err.get("code") == 11000]
+                failed += [{"doc_id": docs[pending[err["index"]]]["doc_id"], "error": err.get("errmsg", "")}
+                           for err in errors if err.get("code") != 11000 or attempt == 1]
+                if not retry or attempt == 1:
+                    break
+                pending = retry
+        if failed:
+            raise KBWriteError(failed, written)
+        return written
+
+    async def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        result = await self.collection.delete_many({"doc_id": {"$in": list(doc_ids)}})
+        return result.deleted_count
+
+    async def doc_ids(self) -> set:
+        return {str(doc_id) for doc_id in await self.collection.distinct("doc_id")}
+
+    async def find_documents(self, doc_ids: Iterable[str] = None, tags: Iterable[str] = None) -> List[dict]:
+        query = {}
+        if doc_ids is not None:
+            query["doc_id"] = {"$in": list(doc_ids)}
+        if tags:
+            query["tags"] = {"$in": list(tags)}
+        return await self.collection.find(query, {"_id": 0}).to_list(length=None)
+
+
+class InMemoryKBStore:
+    """Same interface as MongoKBStore, kept in a dict keyed by doc_id."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def ensure_indexes(self):
+        pass
+
+    async def upsert_documents(self, docs: List[dict]) -> int:
+        changed = 0
+        for d in docs:
+            current = self.documents.get(d["doc_id"])
+            merged = {**(current or {}), **d}
+            if merged != current:
+                self.documents[d["doc_id"]] = merged
+                changed += 1
+        return changed
+
+    async def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        return sum(1 for doc_id in doc_ids if self.documents.pop(doc_id, None) is not None)
+
+    async def doc_ids(self) -> set:
+        return {str(doc_id) for doc_id in self.documents}
+
+    async def find_documents(self, doc_ids: Iterable[str] = None, tags: Iterable[str] = None) -> List[dict]:
+        wanted = set(doc_ids) if doc_ids is not None else None
+        tags = set(tags or [])
+        return [
+            dict(d) for doc_id, d in self.documents.items()
+            if (wanted is None or doc_id in wanted) and (not tags or tags & set(d.get("tags") or []))
+        ]
+
+
+KB_STORES = {
+    "mongo": MongoKBStore,
+    "memory": InMemoryKBStore,
+}
+
+
+def get_kb_store():
+    store = KB_STORES.get(settings.KB_STORE_BACKEND)
+    if store is None:
+        raise ValueError(f"Unknown KB_STORE_BACKEND {settings.KB_STORE_BACKEND!r}")
+    return store()
+
+
+kb_store = get_kb_store()
@@ -1,14 +1,77 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from admission import AdmissionControlMiddleware, budget_from_env
+from profiling import ProfilingMiddleware
+from readiness import Readiness
 
 from .models import IngestRequest, QueryRequest
-from .db import kb_collection
+from .db import KBWriteError, kb_store
 from .vectorstore import get_vectorstore
+from .chunking import chunk_document, merge_chunks
 from .config import settings
 from .audio import router as audio_router
 
-app = FastAPI(title="Campus Assistant API")
+
+# The embedding model + FAISS index and the Mongo pool are warmed in the background
+# after startup (see readiness.py): /health answers at once, /ready and the routes
+# that need them wait for the warm-up.
+readiness = Readiness()
+readiness.add("kb_store", kb_store.connect)
+readiness.add("vectorstore", get_vectorstore)
+
+
+async def vectorstore():
+    await readiness.require("vectorstore")
+    return get_vectorstore()
+
+
+async def store():
+    await readiness.require("kb_store")
+    return kb_store
+
+
+async def compact_periodically(interval: float):
+    # Replaced / deleted vectors are only tombstoned; drop them from the index once they pile up
+    while True:
+        await asyncio.sleep(interval)
+        if not readiness.is_ready("vectorstore"):
+            continue
+        try:
+            removed = await asyncio.to_thread(get_vectorstore().compact)
+            if removed:
+                print(f"Compacted vector store: removed {removed} tombstoned vectors")
+        except Exception as e:
+            print(f"Vector store compaction failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Opening the Mongo pool (+ doc_id / tags indexes) and loading the embedding
+    # model / index happen in the background, so the lifespan yields right away
+    readiness.start()
+    compactor = asyncio.create_task(compact_periodically(settings.VECTORSTORE_COMPACT_INTERVAL_SECONDS))
+    yield
+    compactor.cancel()
+    try:
+        await compactor
+    except asyncio.CancelledError:
+        pass
+    await readiness.stop()
+    await kb_store.close()
+
+
+app = FastAPI(title="Campus Assistant API", lifespan=lifespan)
+
+# Transcription / synthesis are the expensive routes here: per-client rate and concurrency caps
+app.add_middleware(
+    AdmissionControlMiddleware,
+    budgets=[budget_from_env("AUDIO", "/audio/", rate_per_minute=10, burst=3, concurrency=4, max_queue=8)],
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +80,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-vs = get_vectorstore()
+# Opt-in sampling profiler (PROFILING_TOKEN); outermost so it sees queueing time too
+app.add_middleware(ProfilingMiddleware, app_name="app.main")
 
 # include audio router
 app.include_router(audio_router, prefix="/audio")
@@ -25,32 +89,104 @@ app.include_router(audio_router, prefix="/audio")
 
 @app.get("/health")
 def health():
+    # Liveness only: true as soon as the process serves requests
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    # Readiness: 503 until the KB store is connected and the vector store is loaded
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.post("/ingest")
-def ingest(req: IngestRequest):
-    docs_to_add = []
-    for d in req.documents:
-        doc = d.dict()
-        # store in mongodb
-        kb_collection.update_one({"doc_id": doc["doc_id"]}, {"$set": doc}, upsert=True)
-        docs_to_add.append({"content": doc["content"], "metadata": {"doc_id": doc["doc_id"], "title": doc.get("title"), "tags": doc.get("tags")}})
+async def ingest(req: IngestRequest):
+    kb_store = await store()
+    vs = await vectorstore()
+    docs = [d.dict() for d in req.documents]
+    # store in mongodb: one bulk upsert for the whole request
+    failed = []
+    try:
+        await kb_store.upsert_documents(docs)
+    except KBWriteError as e:
+        # The rest of the batch was stored: index it too, so the store and the index agree
+        failed = e.failed
+        failed_ids = {f["doc_id"] for f in failed}
+        docs = [d for d in docs if d["doc_id"] not in failed_ids]
+    # long pages become several overlapping chunks, all keyed by the doc_id
+    docs_to_add = [chunk for doc in docs for chunk in chunk_document(doc)]
+    try:
+        # Upsert by doc_id: re-ingesting a document replaces its vectors instead of duplicating them.
+        # Embedding is CPU-bound, so it runs off the event loop.
+        updated = await asyncio.to_thread(vs.upsert_documents, docs_to_add)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"vectorstore error: {e}")
+    if failed:
+        return JSONResponse({"ingested": len(docs), "reindexed": updated, "failed": failed}, status_code=207)
+    return {"ingested": len(docs), "reindexed": updated}
+
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    kb_store = await store()
+    vs = await vectorstore()
+    deleted = await kb_store.delete_documents([doc_id])
+    try:
+        removed = await asyncio.to_thread(vs.delete_documents, [doc_id])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"vectorstore error: {e}")
+    if not deleted and not removed:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"deleted": doc_id}
+
+
+@app.get("/documents")
+async def list_documents(tag: str | None = None):
+    kb_store = await store()
+    # Metadata lookup by tag (served by the tags index)
+    docs = await kb_store.find_documents(tags=[tag] if tag else None)
+    return {"documents": [{k: d.get(k) for k in ("doc_id", "title", "tags")} for d in docs]}
+
+
+@app.get("/index/status")
+async def index_status():
+    kb_store = await store()
+    vs = await vectorstore()
+    # Index size vs live documents, and doc_ids that differ between the KB store and the index
+    try:
+        report = await asyncio.to_thread(vs.check_consistency, await kb_store.doc_ids())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"vectorstore error: {e}")
+    return {**vs.stats(), **report}
+
+
+@app.post("/index/repair")
+async def index_repair():
+    kb_store = await store()
+    vs = await vectorstore()
+    # Re-embeds documents missing from the index and drops ones no longer in the KB store
     try:
-        vs.add_documents(docs_to_add)
+        report = await asyncio.to_thread(vs.check_consistency, await kb_store.doc_ids())
+        if report["orphaned_in_index"]:
+            await asyncio.to_thread(vs.delete_documents, report["orphaned_in_index"])
+        if report["missing_from_index"]:
+            missing = await kb_store.find_documents(doc_ids=report["missing_from_index"])
+            await asyncio.to_thread(vs.upsert_documents, [c for doc in missing for c in chunk_document(doc)])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"vectorstore error: {e}")
-    return {"ingested": len(docs_to_add)}
+    return {**vs.stats(), **report}
 
 
 @app.post("/query")
-def query(req: QueryRequest):
+async def query(req: QueryRequest):
+    vs = await vectorstore()
     query_text = req.query
     top_k = req.top_k or 4
-    retrieved = vs.retrieve(query_text, k=top_k)
-    snippets = []
-    for r in retrieved:
-        snippets.append({"content": r.page_content, "metadata": r.metadata})
+    # Embedding the query is CPU-bound; keep it off the event loop
+    retrieved = await asyncio.to_thread(vs.retrieve, query_text, k=top_k)
+    # top_k best chunks, adjacent ones stitched back together, capped at QUERY_CONTEXT_MAX_CHARS
+    snippets = merge_chunks(retrieved)
 
     # If OpenAI key present, call generation; otherwise return retrieved snippets
     if settings.OPENAI_API_KEY:
@@ -67,7 +203,7 @@ Question: {query}
             docs_text = "\n---\n".join([f"Title: {s['metadata'].get('title')}\n{s['content']}" for s in snippets])
             filled = prompt.format(docs=docs_text, query=query_text)
             llm = OpenAI(openai_api_key=settings.OPENAI_API_KEY, temperature=0.2)
-            answer = llm(filled)
+            answer = await asyncio.to_thread(llm, filled)
             return {"answer": answer, "sources": snippets}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
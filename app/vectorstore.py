@@ -1,45 +1,250 @@
+import hashlib
+import json
 import os
-from typing import List
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterable, List
 
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.docstore.document import Document as LCDoc
+from shared_state import FileLock, atomic_write_json, file_signature
 
 from .config import settings
 
+# Vectors are keyed by doc_id. Every vector gets its own id (the FAISS docstore id,
+# also kept in metadata["vector_id"]), and the id map - doc_id -> content hash +
+# vector ids - is saved next to the index:
+#   - upsert: an unchanged document is skipped; a changed one gets new vectors and
+#     its old ones are dropped from the map (tombstoned)
+#   - delete: the document is dropped from the map; only the small id map is rewritten
+#   - search: results whose vector id isn't live are filtered out
+#   - compact(): physically removes tombstoned vectors once they are a large enough
+#     share of the index, run periodically from the app's lifespan
+# FAISS.save_local writes index.faiss and index.pkl separately, so an index is never
+# rewritten in place: each save goes to a temp dir that is renamed (os.replace) to a
+# new version dir next to VECTORSTORE_PATH, and the id map - written last, naming
+# that version - is the one marker other workers watch for reloads. The previous
+# version is kept for workers still loading it; older ones are removed.
+#
+# langchain / sentence-transformers / faiss are imported when the first VectorStore
+# is built (the app's readiness warm-up), not when this module is imported.
+SentenceTransformerEmbeddings = FAISS = LCDoc = None
+
+
+def _import_langchain():
+    global SentenceTransformerEmbeddings, FAISS, LCDoc
+    if FAISS is None:
+        from langchain.embeddings import SentenceTransformerEmbeddings
+        from langchain.vectorstores import FAISS
+        from langchain.docstore.document import Document as LCDoc
+
+
+def content_hash(docs: List[dict]) -> str:
+    digest = hashlib.sha256()
+    for d in docs:
+        digest.update(d["content"].encode("utf-8") + b"\0")
+        metadata = {k: v for k, v in d.get("metadata", {}).items() if k != "vector_id"}
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
 
 class VectorStore:
     def __init__(self):
         self.index_path = settings.VECTORSTORE_PATH
+        self.ids_path = self.index_path + ".ids.json"
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        _import_langchain()
         self.embedding_model = SentenceTransformerEmbeddings(model_name=settings.EMBEDDING_MODEL_NAME)
         self.store = None
-        self._load_or_init()
+        self._docs = {} # doc_id -> {"hash": str, "vectors": [vector_id, ...]}
+        self._live = set()
+        # Other workers save to the same index_path; reload whenever it changes on disk
+        self._lock = FileLock(self.index_path + ".lock")
+        self._write_lock = threading.Lock()
+        self._version = None
+        self._ids_signature = None
+        self._load()
+
+    def _version_dir(self, version):
+        # No version: an index saved before versioning, directly at index_path
+        return f"{self.index_path}.v-{version}" if version else self.index_path
 
-    def _load_or_init(self):
+    def _load(self):
+        """
+        Reads the id map once and loads the index version it names, so the ids always
+        match the in-memory index. Leaves the current state alone (and retries on the
+        next call) if that version can't be loaded, e.g. pruned by a newer save.
+        """
+        signature = file_signature(self.ids_path)
         try:
-            if os.path.exists(self.index_path + ".pkl") or os.path.exists(self.index_path):
-                self.store = FAISS.load_local(self.index_path, self.embedding_model)
-            else:
-                # empty index
-                self.store = None
-        except Exception:
-            self.store = None
-
-    def add_documents(self, docs: List[dict]):
-        # docs: list of {"content":..., "metadata":{}}
-        lc_docs = [LCDoc(page_content=d["content"], metadata=d.get("metadata", {})) for d in docs]
+            with open(self.ids_path, "r") as f:
+                state = json.load(f)
+            docs = state["docs"]
+        except (OSError, ValueError, KeyError, TypeError):
+            state, docs = {}, None
+        version = state.get("index")
+        if version != self._version or self._ids_signature is None:
+            path = self._version_dir(version)
+            try:
+                store = FAISS.load_local(path, self.embedding_model) if os.path.exists(path) else None # None: empty index
+            except Exception as e:
+                print(f"Vector index {path} could not be loaded: {e!r}")
+                if version is not None:
+                    return
+                store = None
+            self.store, self._version = store, version
+        self._ids_signature = signature
+        self._docs = docs if docs is not None else self._adopt_existing_vectors()
+        self._live = {v for entry in self._docs.values() for v in entry["vectors"]}
+
+    def _adopt_existing_vectors(self):
+        # Index saved before the id map existed: group its vectors by their doc_id so
+        # the next upsert of a document replaces all of its (possibly duplicate) copies.
+        docs = {}
         if self.store is None:
-            self.store = FAISS.from_documents(lc_docs, self.embedding_model)
-        else:
-            self.store.add_documents(lc_docs)
-        self.store.save_local(self.index_path)
+            return docs
+        for vector_id in self.store.index_to_docstore_id.values():
+            doc = self.store.docstore.search(vector_id)
+            doc_id = None
+            if isinstance(doc, LCDoc):
+                doc.metadata["vector_id"] = vector_id # saved with the index on the next write
+                doc_id = doc.metadata.get("doc_id")
+            entry = docs.setdefault(str(doc_id) if doc_id is not None else f"legacy:{vector_id}", {"hash": None, "vectors": []})
+            entry["vectors"].append(vector_id)
+        return docs
+
+    def _reload_if_changed(self):
+        # The id map is written last by every save, so it alone says whether anything changed
+        if file_signature(self.ids_path) != self._ids_signature:
+            self._load()
+
+    def _save(self, index_changed: bool):
+        if index_changed and self.store is not None:
+            version = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+            tmp = self._version_dir(version) + ".tmp"
+            self.store.save_local(tmp)
+            os.replace(tmp, self._version_dir(version))
+            self._version = version
+        atomic_write_json(self.ids_path, {"index": self._version, "docs": self._docs})
+        self._ids_signature = file_signature(self.ids_path)
+        self._live = {v for entry in self._docs.values() for v in entry["vectors"]}
+        if index_changed:
+            self._prune_versions()
+
+    def _prune_versions(self, keep: int = 2):
+        # Called with the write lock held, so any other .tmp dir is left over from a crashed writer
+        parent, prefix = os.path.split(self.index_path + ".v-")
+        names = sorted(n for n in os.listdir(parent or ".") if n.startswith(prefix))
+        current = os.path.basename(self._version_dir(self._version))
+        versions = [n for n in names if not n.endswith(".tmp")]
+        stale = [n for n in names if n.endswith(".tmp")] + [n for n in versions[:-keep] if n != current]
+        for name in stale:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+    def _write(self, fn):
+        # Serialize writers across threads and workers, and start from the latest saved index
+        with self._write_lock:
+            while not self._lock.try_acquire():
+                time.sleep(0.05)
+            try:
+                self._reload_if_changed()
+                return fn()
+            finally:
+                self._lock.release()
+
+    def upsert_documents(self, docs: List[dict]):
+        """
+        docs: list of {"content":..., "metadata": {"doc_id": ...}}; entries sharing a
+        doc_id are that document's vectors and replace whatever it had before.
+        Returns the number of documents whose vectors were (re)written.
+        """
+        grouped = {}
+        for d in docs:
+            doc_id = d.get("metadata", {}).get("doc_id")
+            grouped.setdefault(str(doc_id) if doc_id is not None else f"legacy:{uuid.uuid4().hex}", []).append(d)
+
+        def apply():
+            lc_docs, ids, changed = [], [], {}
+            for doc_id, group in grouped.items():
+                digest = content_hash(group)
+                if self._docs.get(doc_id, {}).get("hash") == digest:
+                    continue
+                vector_ids = [uuid.uuid4().hex for _ in group]
+                for d, vector_id in zip(group, vector_ids):
+                    lc_docs.append(LCDoc(page_content=d["content"], metadata={**d.get("metadata", {}), "vector_id": vector_id}))
+                ids.extend(vector_ids)
+                changed[doc_id] = {"hash": digest, "vectors": vector_ids}
+            if not changed:
+                return 0
+            if self.store is None:
+                self.store = FAISS.from_documents(lc_docs, self.embedding_model, ids=ids)
+            else:
+                self.store.add_documents(lc_docs, ids=ids)
+            # The replaced vectors stay in the index as tombstones until compact()
+            self._docs.update(changed)
+            self._save(index_changed=True)
+            return len(changed)
+
+        return self._write(apply)
+
+    # Existing callers: adding is an upsert keyed by metadata["doc_id"]
+    add_documents = upsert_documents
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        def apply():
+            removed = [doc_id for doc_id in map(str, doc_ids) if self._docs.pop(doc_id, None) is not None]
+            if removed:
+                self._save(index_changed=False)
+            return len(removed)
+
+        return self._write(apply)
+
+    def stats(self):
+        self._reload_if_changed()
+        total = self.store.index.ntotal if self.store is not None else 0
+        live = len(self._live)
+        return {"documents": len(self._docs), "live_vectors": live, "total_vectors": total, "tombstones": max(0, total - live)}
+
+    def compact(self, min_tombstones: int = None, min_ratio: float = None) -> int:
+        """Drops tombstoned vectors from the index if there are enough of them; returns how many."""
+        min_tombstones = settings.VECTORSTORE_COMPACT_MIN_TOMBSTONES if min_tombstones is None else min_tombstones
+        min_ratio = settings.VECTORSTORE_COMPACT_RATIO if min_ratio is None else min_ratio
+
+        def apply():
+            if self.store is None:
+                return 0
+            dead = [v for v in self.store.index_to_docstore_id.values() if v not in self._live]
+            total = self.store.index.ntotal
+            if not dead or len(dead) < min_tombstones or len(dead) < min_ratio * total:
+                return 0
+            self.store.delete(dead)
+            self._save(index_changed=True)
+            return len(dead)
+
+        return self._write(apply)
+
+    def check_consistency(self, doc_ids):
+        """Compares the indexed doc_ids with the doc_ids in the KB store (kb_store.doc_ids())."""
+        self._reload_if_changed()
+        stored = {str(doc_id) for doc_id in doc_ids}
+        indexed = {doc_id for doc_id in self._docs if not doc_id.startswith("legacy:")}
+        return {
+            "missing_from_index": sorted(stored - indexed),
+            "orphaned_in_index": sorted(indexed - stored),
+            "untracked_vectors": sum(len(e["vectors"]) for d, e in self._docs.items() if d.startswith("legacy:")),
+        }
 
     def retrieve(self, query: str, k: int = 4):
+        self._reload_if_changed()
         if not self.store:
             return []
-        results = self.store.similarity_search(query, k=k)
-        return results
+        # Over-fetch by the number of tombstones so k live results survive the filter
+        total = self.store.index.ntotal
+        fetch = min(total, k + max(0, total - len(self._live)))
+        if fetch <= 0:
+            return []
+        results = self.store.similarity_search(query, k=fetch)
+        return [r for r in results if r.metadata.get("vector_id") in self._live][:k]
 
 
 _VS = None
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import-time budget check for the API processes and the KB scripts. Each module
+# is imported in a fresh interpreter with `python -X importtime`; the check fails
+# (exit 1) if an import takes longer than its budget or pulls in one of the
+# heavy dependencies that must stay lazy (loaded by the readiness warm-up or on
+# first use instead). Run it in CI or before shipping an image:
+#   python check_import_time.py                  # default targets and budgets
+#   python check_import_time.py main --budget-ms 500 --top 15
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+# module -> (budget in ms or None for IMPORT_BUDGET_MS, heavy modules it may import)
+TARGETS = {
+    "main": (None, set()),
+    "app.main": (None, set()),
+    # The crawler's module-level requests.Session is what the script is for
+    "scrape_and_update_kb": (None, {"requests"}),
+    "add_url_to_kb": (None, set()),
+    "list_models": (None, set()),
+}
+
+# Top-level packages that must not be imported just by importing a target
+HEAVY_MODULES = {
+    "google.generativeai", "requests", "bs4", "langchain", "sentence_transformers",
+    "faiss", "torch", "motor", "pymongo", "gtts", "openai",
+}
+
+PROBE = """
+import json, sys
+import {module}
+heavy = {heavy!r}
+loaded = sorted(m for m in heavy if m in sys.modules)
+print(json.dumps(loaded))
+"""
+
+
+def parse_importtime(stderr: str):
+    """[(cumulative us, module)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), name[1:].rstrip())) # nesting = leading spaces after the first
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module: str):
+    """(total ms, heavy modules loaded, slowest [(ms, module)]) or raises on import failure."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, heavy=sorted(HEAVY_MODULES))],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}")
+    rows = parse_importtime(proc.stderr)
+    # The target's own line carries the cumulative time of everything it imported;
+    # the indented lines right above it are that subtree (interpreter startup is not)
+    end = max(i for i, (_, name) in enumerate(rows) if name.strip() == module)
+    start = end
+    while start > 0 and rows[start - 1][1].startswith(" "):
+        start -= 1
+    heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    slowest = sorted(((us / 1000, name.strip()) for us, name in rows[start:end]), reverse=True)
+    return rows[end][0] / 1000, heavy, slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if importing the app / scripts is slow or loads heavy dependencies.")
+    parser.add_argument("modules", nargs="*", help="Modules to check (default: %s)" % ", ".join(TARGETS))
+    parser.add_argument("--budget-ms", type=float, default=None, help="Budget for every module (default: IMPORT_BUDGET_MS)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list per module")
+    args = parser.parse_args()
+
+    failures = 0
+    for module in args.modules or list(TARGETS):
+        budget, allowed = TARGETS.get(module, (None, set()))
+        budget = args.budget_ms or budget or IMPORT_BUDGET_MS
+        try:
+            total_ms, heavy, slowest = measure(module)
+        except RuntimeError as e:
+            print(f"FAIL {module}: import failed: {e}")
+            failures += 1
+            continue
+        heavy = [m for m in heavy if m not in allowed]
+        ok = total_ms <= budget and not heavy
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module}: {total_ms:.0f} ms (budget {budget:.0f} ms)")
+        if heavy:
+            print(f"     eagerly imports: {', '.join(heavy)}")
+        for ms, name in slowest[:args.top]:
+            print(f"     {ms:8.1f} ms  {name}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import time
+import uuid
+
+from shared_state import atomic_write_json, state_path
+
+# Server-side chat memory. Each session keeps a sliding window of recent turns;
+# turns that fall out of the window are folded into a short extractive summary,
+# so the history sent to the model never grows past HISTORY_TOKEN_BUDGET.
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", "6"))
+CONVERSATION_SUMMARY_CHARS = int(os.getenv("CONVERSATION_SUMMARY_CHARS", "600"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", str(24 * 3600)))
+# Expired session files are swept by save() at most this often (per worker)
+CONVERSATION_PRUNE_INTERVAL_SECONDS = float(os.getenv("CONVERSATION_PRUNE_INTERVAL_SECONDS", "600"))
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "what", "which", "who",
+    "whom", "where", "when", "why", "how", "about", "of", "in", "on", "at", "for", "to", "from", "and",
+    "or", "can", "could", "would", "should", "will", "i", "me", "my", "you", "your", "tell", "please",
+    "give", "show", "list", "any", "there", "it", "its", "they", "them", "their", "this", "that",
+    "these", "those", "he", "she", "his", "her", "also", "more", "details", "svu", "university",
+}
+# Words that only make sense with an earlier turn ("what about their fees?"). Not
+# "it" / "its": they also appear in standalone questions ("Is there an IT department?")
+FOLLOW_UP_MARKERS = {"they", "them", "their", "these", "those", "he", "she", "his", "her",
+                     "same", "else"}
+FOLLOW_UP_MAX_WORDS = 7
+FOLLOW_UP_PREFIXES = ("what about", "how about", "and ", "what else", "tell me more")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prompts
+    return (len(text) + 3) // 4
+
+
+def keywords(text: str):
+    return [t for t in re.findall(r"[a-z0-9.]+", (text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def first_sentence(text: str, limit: int = 160) -> str:
+    sentence = re.split(r"(?<=[.!?])\s+", (text or "").strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "..."
+
+
+class Conversation:
+    def __init__(self, session_id: str, turns=None, summary: str = "", updated_at: float = 0.0):
+        self.session_id = session_id
+        self.turns = turns or []
+        self.summary = summary
+        self.updated_at = updated_at
+
+    def add_turn(self, user: str, assistant: str):
+        self.turns.append({"user": user, "assistant": assistant})
+        while len(self.turns) > CONVERSATION_WINDOW_TURNS:
+            self._fold(self.turns.pop(0))
+        self.updated_at = time.time()
+
+    def _fold(self, turn):
+        # Incremental summary: one line per evicted turn, oldest lines dropped past the cap
+        line = f"- Asked: {first_sentence(turn['user'], 120)} Answer: {first_sentence(turn['assistant'])}"
+        summary = f"{self.summary}\n{line}".strip()
+        while len(summary) > CONVERSATION_SUMMARY_CHARS and "\n" in summary:
+            summary = summary.split("\n", 1)[1]
+        self.summary = summary[-CONVERSATION_SUMMARY_CHARS:]
+
+    def is_follow_up(self, message: str) -> bool:
+        if not self.turns:
+            return False
+        lower = message.lower().strip()
+        tokens = re.findall(r"[a-z]+", lower)
+        if lower.startswith(FOLLOW_UP_PREFIXES):
+            return True
+        # A pronoun only points back at the last turn in a short message with little topic of its
+        # own; "Who is the Finance Officer and what do they do?" stands on its own
+        if any(t in FOLLOW_UP_MARKERS for t in tokens) and len(tokens) <= FOLLOW_UP_MAX_WORDS \
+                and len(keywords(message)) <= 2:
+            return True
+        # Bare one-word questions ("fees?", "timings?")
+        return len(keywords(message)) <= 1 and len(tokens) <= 2
+
+    def retrieval_query(self, message: str) -> str:
+        """
+        Standalone query for find_relevant_context: a follow-up gets the topic words of
+        the most recent turn that had any appended, e.g. "what about its fees?" after
+        "Tell me about the MBA program" becomes "what about its fees? mba program".
+        """
+        if not self.is_follow_up(message):
+            return message
+        present = set(keywords(message))
+        for turn in reversed(self.turns):
+            topic = [k for k in keywords(turn["user"]) if k not in present]
+            if topic:
+                return f"{message} {' '.join(dict.fromkeys(topic))}"
+        return message
+
+    def history_prompt(self, token_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+        """Summary + most recent turns, newest kept first when the budget runs out."""
+        lines = []
+        used = 0
+        for turn in reversed(self.turns):
+            block = f"Student: {turn['user']}\nAssistant: {turn['assistant']}"
+            cost = estimate_tokens(block)
+            if used + cost > token_budget:
+                # Keep at least a truncated version of the latest exchange
+                if not lines:
+                    lines.append(block[: token_budget * 4])
+                    used = token_budget
+                break
+            lines.append(block)
+            used += cost
+        lines.reverse()
+        if self.summary and used + estimate_tokens(self.summary) <= token_budget:
+            lines.insert(0, f"Earlier in this conversation:\n{self.summary}")
+        return "\n\n".join(lines)
+
+    def to_dict(self):
+        return {"turns": self.turns, "summary": self.summary, "updated_at": self.updated_at}
+
+
+class SessionStore:
+    """One small JSON file per session under SHARED_STATE_DIR, so every worker sees it."""
+
+    def __init__(self, directory=None, ttl: float = CONVERSATION_TTL_SECONDS):
+        self.directory = directory or state_path("sessions")
+        self.ttl = ttl
+        self.prune_interval = CONVERSATION_PRUNE_INTERVAL_SECONDS
+        self._pruned_at = time.time() # prune() runs at startup; save() takes it from there
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def load(self, session_id=None) -> Conversation:
+        if not session_id or not SESSION_ID_RE.match(session_id):
+            return Conversation(uuid.uuid4().hex)
+        try:
+            with open(self._path(session_id), "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return Conversation(session_id)
+        if time.time() - data.get("updated_at", 0) > self.ttl:
+            return Conversation(session_id)
+        return Conversation(session_id, data.get("turns", []), data.get("summary", ""), data.get("updated_at", 0))
+
+    def save(self, conversation: Conversation):
+        atomic_write_json(self._path(conversation.session_id), conversation.to_dict())
+        # Amortized cleanup: one directory sweep per prune_interval, not per write
+        if time.time() - self._pruned_at > self.prune_interval:
+            self.prune()
+
+    def prune(self):
+        self._pruned_at = time.time()
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
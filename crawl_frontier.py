@@ -0,0 +1,291 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from shared_state import atomic_write_json
+
+# Crawl frontier for the KB builder. Instead of a fixed URL list, the crawler
+# seeds from the sitemap(s), the home page and any known URLs, follows
+# same-domain links, and spends a fixed fetch budget per run on the pages most
+# likely to be new or changed:
+#   - never-fetched pages first, shallowest first (sitemap priority breaks ties)
+#   - then pages that are most overdue for a revisit; each page's revisit
+#     interval starts from its sitemap <changefreq> and halves when a fetch finds
+#     new content / grows 1.5x when it doesn't; a newer sitemap <lastmod> makes
+#     the page due at once
+# Pages are deduplicated by canonical URL (rel=canonical, normalized host /
+# path / query) and by content hash, and the whole state is saved to
+# CRAWL_STATE_FILE between runs. A fetch that found new content is only saved
+# once commit() says its FAQs were stored: until then save() writes the page's
+# previous state, so an interrupted or failed run fetches and regenerates it again.
+CRAWL_STATE_FILE = os.getenv("CRAWL_STATE_FILE", "crawl_state.json")
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "4"))
+
+DAY = 24 * 3600
+MIN_REVISIT_SECONDS = DAY
+MAX_REVISIT_SECONDS = 60 * DAY
+DEFAULT_REVISIT_SECONDS = 7 * DAY
+CHANGEFREQ_SECONDS = {
+    "always": MIN_REVISIT_SECONDS, "hourly": MIN_REVISIT_SECONDS, "daily": DAY, "weekly": 7 * DAY,
+    "monthly": 30 * DAY, "yearly": MAX_REVISIT_SECONDS, "never": MAX_REVISIT_SECONDS,
+}
+
+SKIP_EXTENSIONS = {
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".zip", ".rar", ".doc", ".docx",
+    ".xls", ".xlsx", ".ppt", ".pptx", ".mp3", ".mp4", ".avi", ".css", ".js", ".xml", ".json",
+}
+SKIP_PATH_RE = re.compile(r"/(wp-admin|wp-login\.php|wp-json|feed|xmlrpc\.php|tag|author)(/|$)")
+TRACKING_PARAMS_RE = re.compile(r"^(utm_\w+|fbclid|gclid|replytocom|share)$")
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+def canonical_url(url: str, base: str = None):
+    """Normalized absolute URL, or None for links the crawler shouldn't follow."""
+    url = urljoin(base, url.strip()) if base else url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.endswith(":80") or host.endswith(":443"):
+        host = host.rsplit(":", 1)[0]
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if path != "/":
+        path = path.rstrip("/") # "/about/" and "/about" are the same page on this site
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS_RE.match(k)))
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def is_crawlable(url: str, domain: str) -> bool:
+    parts = urlsplit(url)
+    if parts.netloc != domain:
+        return False
+    if os.path.splitext(parts.path)[1].lower() in SKIP_EXTENSIONS:
+        return False
+    return not SKIP_PATH_RE.search(parts.path)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def parse_lastmod(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_sitemap(xml_text: str):
+    """
+    ([{"url", "lastmod", "changefreq", "priority"}], [child sitemap URLs]) from a
+    urlset or a sitemapindex document.
+    """
+    try:
+        root = ET.fromstring(xml_text.encode("utf-8") if isinstance(xml_text, str) else xml_text)
+    except ET.ParseError:
+        return [], []
+    entries, children = [], []
+    tag = root.tag.replace(SITEMAP_NS, "")
+    for node in root:
+        loc = node.findtext(f"{SITEMAP_NS}loc") or node.findtext("loc")
+        if not loc:
+            continue
+        if tag == "sitemapindex":
+            children.append(loc.strip())
+            continue
+        priority = node.findtext(f"{SITEMAP_NS}priority") or node.findtext("priority")
+        try:
+            priority = float(priority) if priority else 0.5
+        except ValueError:
+            priority = 0.5
+        entries.append({
+            "url": loc.strip(),
+            "lastmod": parse_lastmod(node.findtext(f"{SITEMAP_NS}lastmod") or node.findtext("lastmod")),
+            "changefreq": (node.findtext(f"{SITEMAP_NS}changefreq") or node.findtext("changefreq") or "").strip().lower() or None,
+            "priority": priority,
+        })
+    return entries, children
+
+
+def parse_page(html: str, url: str):
+    """(canonical URL, outgoing links, soup) for a fetched page."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    canonical = None
+    link = soup.find("link", rel="canonical")
+    if link and link.get("href"):
+        canonical = canonical_url(link["href"], url)
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        if href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            continue
+        found = canonical_url(href, url)
+        if found:
+            links.append(found)
+    return canonical or canonical_url(url), list(dict.fromkeys(links)), soup
+
+
+class CrawlFrontier:
+    def __init__(self, domain: str, path: str = CRAWL_STATE_FILE, max_depth: int = CRAWL_MAX_DEPTH):
+        self.domain = domain
+        self.path = path
+        self.max_depth = max_depth
+        self.pages = {} # canonical URL -> page state
+        self.hashes = {} # content hash -> canonical URL of the first page with that content
+        self.uncommitted = {} # canonical URL -> page state before a "changed" fetch not yet committed
+
+    @classmethod
+    def load(cls, domain: str, path: str = CRAWL_STATE_FILE, max_depth: int = CRAWL_MAX_DEPTH):
+        frontier = cls(domain, path, max_depth)
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+            frontier.pages = state.get("pages", {})
+        except (OSError, json.JSONDecodeError):
+            pass
+        for url, page in frontier.pages.items():
+            if page.get("hash") and not page.get("duplicate_of"):
+                frontier.hashes.setdefault(page["hash"], url)
+        return frontier
+
+    def save(self):
+        pages = {**self.pages, **self.uncommitted}
+        atomic_write_json(self.path, {"domain": self.domain, "saved_at": time.time(), "pages": pages}, indent=1)
+
+    def commit(self, urls):
+        """Marks "changed" fetches as done (their FAQs are stored); the next save() keeps them."""
+        for url in urls:
+            self.uncommitted.pop(url, None)
+
+    def add(self, url: str, depth: int = 0, lastmod=None, changefreq=None, priority: float = 0.5, base: str = None):
+        """Adds or updates a URL; returns its canonical form if it is crawlable, else None."""
+        url = canonical_url(url, base)
+        if not url or not is_crawlable(url, self.domain) or depth > self.max_depth:
+            return None
+        page = self.pages.get(url)
+        if page is None:
+            page = self.pages[url] = {
+                "depth": depth, "priority": priority, "first_seen": time.time(),
+                "last_fetched": None, "last_changed": None, "hash": None, "fetches": 0, "changes": 0,
+            }
+        else:
+            page["depth"] = min(page["depth"], depth)
+            page["priority"] = max(page.get("priority", 0.5), priority)
+        if lastmod:
+            page["sitemap_lastmod"] = lastmod
+        if changefreq:
+            page["changefreq"] = changefreq
+        return url
+
+    def add_sitemap_entries(self, entries):
+        return sum(1 for e in entries if self.add(e["url"], depth=1, lastmod=e["lastmod"],
+                                                   changefreq=e["changefreq"], priority=e["priority"]))
+
+    def revisit_interval(self, page) -> float:
+        # Starts at the sitemap's changefreq (or a week) and adapts per fetch, see _adapt
+        hint = CHANGEFREQ_SECONDS.get(page.get("changefreq"), DEFAULT_REVISIT_SECONDS)
+        return page.get("interval") or hint
+
+    def _adapt(self, page, changed: bool):
+        # Halve the interval when the page changed, stretch it by half when it didn't
+        interval = self.revisit_interval(page) * (0.5 if changed else 1.5)
+        page["interval"] = min(MAX_REVISIT_SECONDS, max(MIN_REVISIT_SECONDS, interval))
+
+    def _score(self, page, now):
+        """Sort key (lower = sooner), or None if the page isn't due."""
+        if page.get("gone"):
+            return None
+        if page["last_fetched"] is None:
+            return (0, page["depth"], -page.get("priority", 0.5))
+        if page.get("sitemap_lastmod") and page["sitemap_lastmod"] > page["last_fetched"]:
+            return (1, page["depth"], -page.get("priority", 0.5))
+        # Duplicates are rechecked rarely, in case the pages diverge again
+        interval = MAX_REVISIT_SECONDS if page.get("duplicate_of") else self.revisit_interval(page)
+        overdue = (now - page["last_fetched"]) / interval
+        if overdue < 1:
+            return None
+        return (2, -overdue, page["depth"])
+
+    def next_batch(self, budget: int, now: float = None):
+        now = now or time.time()
+        scored = ((self._score(page, now), url) for url, page in self.pages.items())
+        return [url for _, url in heapq.nsmallest(budget, ((s, u) for s, u in scored if s is not None))]
+
+    def record_fetch(self, url: str, text: str = None, links=(), canonical: str = None, error: str = None, now: float = None):
+        """
+        Updates a page after a fetch and queues its links. Returns "changed", "unchanged",
+        "duplicate" or "error"; only "changed" pages need their FAQs regenerated, and
+        they stay uncommitted (see save / commit) until that is done.
+        """
+        now = now or time.time()
+        page = self.pages[url]
+        before = json.loads(json.dumps(page))
+        page["last_fetched"] = now
+        if error is not None:
+            page["errors"] = page.get("errors", 0) + 1
+            page["last_error"] = error
+            # Stop revisiting pages that keep failing (removed / 404)
+            if page["errors"] >= 3:
+                page["gone"] = True
+            return "error"
+        page["errors"] = 0
+        page["fetches"] += 1
+        page.pop("duplicate_of", None)
+
+        if canonical and canonical != url and is_crawlable(canonical, self.domain):
+            self.add(canonical, depth=page["depth"])
+            page["duplicate_of"] = canonical
+            return "duplicate"
+
+        digest = content_hash(text or "")
+        owner = self.hashes.setdefault(digest, url)
+        if owner != url:
+            page["duplicate_of"] = owner
+            return "duplicate"
+
+        for link in links:
+            self.add(link, depth=page["depth"] + 1)
+
+        previous = page["hash"]
+        page["hash"] = digest
+        # First fetch of a page whose FAQs predate the frontier: keep them
+        if previous == digest or (previous is None and page.pop("bootstrapped", False)):
+            self._adapt(page, changed=False)
+            return "unchanged"
+        if previous is not None:
+            if self.hashes.get(previous) == url:
+                del self.hashes[previous]
+            page["changes"] += 1
+            self._adapt(page, changed=True)
+        page["last_changed"] = now
+        self.uncommitted.setdefault(url, before)
+        return "changed"
+
+    def mark_known(self, url: str, fetched_at: float, depth: int = 1):
+        """
+        A URL already processed before the frontier existed: due again after its normal
+        interval. Its link depth wasn't recorded, so it counts as one hop from the root
+        (like sitemap entries) rather than as a seed.
+        """
+        url = self.add(url, depth=depth)
+        if url and self.pages[url]["last_fetched"] is None:
+            self.pages[url]["last_fetched"] = fetched_at
+            self.pages[url]["bootstrapped"] = True
+        return url
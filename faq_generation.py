@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from conversation import estimate_tokens
+
+# FAQ generation for the KB builders (scrape_and_update_kb.py, add_url_to_kb.py).
+# Instead of one Gemini call per page, pages are packed into batches of up to
+# FAQ_BATCH_TOKEN_BUDGET tokens of page text and answered in one call each, with a
+# JSON schema for the output. Each returned item is validated on its own, so a
+# bad item only drops that item; pages that end up with no valid FAQs (or whose
+# batch failed outright) are retried in new, smaller batches - the rest are kept.
+FAQ_BATCH_TOKEN_BUDGET = int(os.getenv("FAQ_BATCH_TOKEN_BUDGET", "12000"))
+FAQ_MAX_PAGES_PER_BATCH = int(os.getenv("FAQ_MAX_PAGES_PER_BATCH", "8"))
+FAQ_MAX_ATTEMPTS = int(os.getenv("FAQ_MAX_ATTEMPTS", "3"))
+FAQ_CONCURRENCY = int(os.getenv("FAQ_CONCURRENCY", "2"))
+
+MIN_QUESTION_CHARS = 8
+MAX_QUESTION_CHARS = 300
+MAX_ANSWER_CHARS = 2000
+
+FAQ_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "page": {"type": "INTEGER"},
+            "question": {"type": "STRING"},
+            "answer": {"type": "STRING"},
+        },
+        "required": ["page", "question", "answer"],
+    },
+}
+
+PROMPT_HEADER = """
+Below are {count} pages scraped from the Sri Venkateswara University website, each starting with a "=== Page N ===" line.
+For EACH page, extract key facts, dates, names, roles, and procedures and generate 5 to 10 high-quality
+Question-Answer pairs (FAQs) based ONLY on that page's text. Questions and answers must make sense on their
+own, without referring to "this page" or "the text".
+Return a JSON array of objects with "page" (the page number the FAQ comes from), "question" and "answer".
+"""
+
+
+class Page:
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def pack_batches(pages, token_budget: int = FAQ_BATCH_TOKEN_BUDGET, max_pages: int = FAQ_MAX_PAGES_PER_BATCH):
+    """Greedy first-fit, largest pages first; a page bigger than the budget goes alone."""
+    batches = []
+    for page in sorted(pages, key=lambda p: p.tokens, reverse=True):
+        for batch in batches:
+            if len(batch) < max_pages and sum(p.tokens for p in batch) + page.tokens <= token_budget:
+                batch.append(page)
+                break
+        else:
+            batches.append([page])
+    return batches
+
+
+def build_prompt(batch) -> str:
+    parts = [PROMPT_HEADER.format(count=len(batch))]
+    for n, page in enumerate(batch, 1):
+        parts.append(f"=== Page {n} === ({page.url})\n{page.text}\n")
+    return "\n".join(parts)
+
+
+def parse_items(content: str):
+    content = content.strip()
+    # Older models may still wrap the JSON in a markdown fence
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+    items = json.loads(content)
+    if isinstance(items, dict):
+        items = items.get("faqs") or items.get("items") or []
+    return items if isinstance(items, list) else []
+
+
+def validate_item(item, page_count: int):
+    """(page index, {"question", "answer"}) for a usable item, otherwise None."""
+    if not isinstance(item, dict):
+        return None
+    try:
+        page = int(item.get("page", 1 if page_count == 1 else 0))
+    except (TypeError, ValueError):
+        return None
+    question = item.get("question")
+    answer = item.get("answer")
+    if not (1 <= page <= page_count) or not isinstance(question, str) or not isinstance(answer, str):
+        return None
+    question = " ".join(question.split())
+    answer = answer.strip()
+    if not (MIN_QUESTION_CHARS <= len(question) <= MAX_QUESTION_CHARS) or not answer or len(answer) > MAX_ANSWER_CHARS:
+        return None
+    return page - 1, {"question": question, "answer": answer}
+
+
+def configure_genai():
+    """
+    Imports and configures google.generativeai on first use (grpc/protobuf make the
+    import slow), so scripts only pay for it once they actually generate. Exits if
+    GOOGLE_API_KEY is missing.
+    """
+    import google.generativeai as genai
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("Error: GOOGLE_API_KEY not found in .env file.")
+        raise SystemExit(1)
+    genai.configure(api_key=api_key)
+    return genai
+
+
+def is_rate_limited(error) -> bool:
+    return "429" in str(error) or "quota" in str(error).lower()
+
+
+class FAQGenerator:
+    """One model client shared by every batch of a run."""
+
+    def __init__(self, model_name: str, concurrency: int = FAQ_CONCURRENCY, max_attempts: int = FAQ_MAX_ATTEMPTS):
+        self.model = configure_genai().GenerativeModel(model_name)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.calls = 0
+
+    def _generate_batch(self, batch):
+        """{page url: [faqs]} for the pages of one batch that got at least one valid FAQ."""
+        config = {"response_mime_type": "application/json", "response_schema": FAQ_RESPONSE_SCHEMA}
+        for attempt in range(self.max_attempts):
+            try:
+                self.calls += 1
+                response = self.model.generate_content(build_prompt(batch), generation_config=config)
+                items = parse_items(response.text)
+                break
+            except Exception as e:
+                if is_rate_limited(e) and attempt + 1 < self.max_attempts:
+                    wait_time = (attempt + 1) * 10
+                    print(f"  !! Rate limit hit. Waiting {wait_time}s before retry {attempt+1}/{self.max_attempts}...")
+                    time.sleep(wait_time)
+                    continue
+                print(f"  !! Batch of {len(batch)} pages failed: {e}")
+                return {}
+
+        results = {}
+        seen = set()
+        dropped = 0
+        for item in items:
+            valid = validate_item(item, len(batch))
+            if valid is None:
+                dropped += 1
+                continue
+            index, faq = valid
+            key = (index, faq["question"].lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            results.setdefault(batch[index].url, []).append(faq)
+        if dropped:
+            print(f"  - Dropped {dropped} invalid items from a batch of {len(batch)} pages")
+        return results
+
+    def generate(self, pages):
+        """
+        Yields (page, faqs) as pages are done; faqs is [] for a page that still had no
+        valid FAQs after FAQ_MAX_ATTEMPTS rounds. Each retry round re-packs only the
+        failed pages, at most half as many per batch as before.
+        """
+        pending = list(pages)
+        max_pages = FAQ_MAX_PAGES_PER_BATCH
+        for round_number in range(1, self.max_attempts + 1):
+            if not pending:
+                return
+            batches = pack_batches(pending, max_pages=max_pages)
+            print(f"Generating FAQs for {len(pending)} pages in {len(batches)} requests (round {round_number})...")
+            failed = []
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = {pool.submit(self._generate_batch, batch): batch for batch in batches}
+                for future in as_completed(futures):
+                    results = future.result()
+                    for page in futures[future]:
+                        if results.get(page.url):
+                            yield page, results[page.url]
+                        else:
+                            failed.append(page)
+            pending = failed
+            max_pages = max(1, max_pages // 2)
+        for page in pending:
+            print(f"  !! Failed to generate FAQs for {page.url} after {self.max_attempts} rounds.")
+            yield page, []
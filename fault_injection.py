@@ -0,0 +1,340 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs
+
+# Offline stand-ins for the chat path's two remote dependencies - Gemini
+# (get_model in main.py) and the HTTP fetches behind search_university_website
+# (main.search_google_site, live_feed.fetch_updates) - with injected faults, so
+# deadlines and fallbacks can be tuned and soak-tested without network access.
+#
+# FAULT_INJECTION selects a profile: a preset name from PRESETS, or the path of a
+# JSON file with the same shape. Empty (the default) means the real dependencies.
+# A profile has one section per dependency ("gemini", "web"):
+#   latency       {"dist": "fixed", "ms"} | {"dist": "uniform", "min_ms", "max_ms"}
+#                 | {"dist": "lognormal", "p50_ms", "p99_ms"}
+#   timeout_rate  share of calls that hang until the caller's timeout, then time out
+#   error_rate    share of calls that fail outright (connection reset / 500)
+#   quota_rate    gemini: share of calls answered with 429 ResourceExhausted
+#   blocked_rate  gemini: share of responses with no text (.text raises ValueError)
+#   status_rate   web: share of responses with a 403 / 5xx status
+#   malformed_rate web: share of 200 responses whose HTML is truncated, a captcha
+#                 page, tag soup, empty or not HTML at all
+# plus an optional top-level "seed" (or FAULT_INJECTION_SEED) for repeatable runs.
+# Raised errors are the ones the real clients raise (google.api_core.exceptions,
+# requests.exceptions), so the production handlers see what they'd see live.
+FAULT_INJECTION = os.getenv("FAULT_INJECTION", "")
+FAULT_INJECTION_SEED = os.getenv("FAULT_INJECTION_SEED")
+# Upper bound on a "hang" when the caller passed no timeout
+HANG_SECONDS = 60.0
+
+HEALTHY_GEMINI = {"latency": {"dist": "lognormal", "p50_ms": 900, "p99_ms": 3500}}
+HEALTHY_WEB = {"latency": {"dist": "lognormal", "p50_ms": 250, "p99_ms": 1500}}
+
+PRESETS = {
+    "healthy": {"gemini": HEALTHY_GEMINI, "web": HEALTHY_WEB},
+    # svuniversity.edu.in on a bad day: slow, often timing out, sometimes serving broken pages
+    "slow_site": {
+        "gemini": HEALTHY_GEMINI,
+        "web": {"latency": {"dist": "lognormal", "p50_ms": 2500, "p99_ms": 12000},
+                "timeout_rate": 0.2, "error_rate": 0.05, "status_rate": 0.05, "malformed_rate": 0.1},
+    },
+    "site_down": {"gemini": HEALTHY_GEMINI, "web": {"latency": {"dist": "fixed", "ms": 50}, "error_rate": 1.0}},
+    # Gemini rate limited: most calls 429 quickly, the rest are slow
+    "quota": {
+        "gemini": {"latency": {"dist": "lognormal", "p50_ms": 1500, "p99_ms": 6000}, "quota_rate": 0.6},
+        "web": HEALTHY_WEB,
+    },
+    "chaos": {
+        "gemini": {"latency": {"dist": "lognormal", "p50_ms": 1200, "p99_ms": 8000},
+                   "quota_rate": 0.15, "timeout_rate": 0.05, "error_rate": 0.05, "blocked_rate": 0.02},
+        "web": {"latency": {"dist": "lognormal", "p50_ms": 1500, "p99_ms": 10000},
+                "timeout_rate": 0.1, "error_rate": 0.05, "status_rate": 0.05, "malformed_rate": 0.15},
+    },
+}
+
+# Order in which an outcome is drawn for one call; whatever is left over is "ok"
+GEMINI_OUTCOMES = ("timeout", "error", "quota", "blocked")
+WEB_OUTCOMES = ("timeout", "error", "status", "malformed")
+MALFORMED_KINDS = ("truncated", "captcha", "tag_soup", "empty", "not_html")
+
+# Pages the fake site knows about; anything else on the domain gets a generic page
+SITE_PAGES = [
+    "https://svuniversity.edu.in/admissions/", "https://svuniversity.edu.in/examinations/",
+    "https://svuniversity.edu.in/hostels/", "https://svuniversity.edu.in/fee-structure/",
+    "https://svuniversity.edu.in/departments/", "https://svuniversity.edu.in/library/",
+]
+
+
+def load_profile(spec: str) -> dict:
+    """A preset by name, or a JSON profile file."""
+    if spec in PRESETS:
+        return PRESETS[spec]
+    try:
+        with open(spec, "r") as f:
+            return json.load(f)
+    except OSError:
+        raise ValueError(f"FAULT_INJECTION={spec!r} is neither a preset ({', '.join(PRESETS)}) nor a readable profile file")
+
+
+class LatencyModel:
+    def __init__(self, spec: dict = None):
+        spec = spec or {"dist": "fixed", "ms": 0}
+        self.dist = spec.get("dist", "fixed")
+        if self.dist == "fixed":
+            self.ms = float(spec.get("ms", 0))
+        elif self.dist == "uniform":
+            self.min_ms, self.max_ms = float(spec["min_ms"]), float(spec["max_ms"])
+        elif self.dist == "lognormal":
+            # p99 of a lognormal is median * exp(2.326 * sigma)
+            self.mu = math.log(float(spec["p50_ms"]))
+            self.sigma = max(0.0, math.log(float(spec["p99_ms"]) / float(spec["p50_ms"])) / 2.326)
+        else:
+            raise ValueError(f"Unknown latency distribution {self.dist!r}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds."""
+        if self.dist == "fixed":
+            return self.ms / 1000
+        if self.dist == "uniform":
+            return rng.uniform(self.min_ms, self.max_ms) / 1000
+        return rng.lognormvariate(self.mu, self.sigma) / 1000
+
+
+class DependencyFaults:
+    """Draws one outcome and latency per call for one dependency."""
+
+    def __init__(self, spec: dict, outcomes):
+        spec = spec or {}
+        self.latency = LatencyModel(spec.get("latency"))
+        self.rates = [(outcome, float(spec.get(f"{outcome}_rate", 0.0))) for outcome in outcomes]
+        if sum(rate for _, rate in self.rates) > 1.0:
+            raise ValueError(f"Fault rates add up to more than 1: {dict(self.rates)}")
+
+    def draw(self, rng: random.Random):
+        roll = rng.random()
+        for outcome, rate in self.rates:
+            if roll < rate:
+                return outcome, self.latency.sample(rng)
+            roll -= rate
+        return "ok", self.latency.sample(rng)
+
+
+class FakeResponse:
+    """The parts of requests.Response the scrapers use."""
+
+    def __init__(self, url: str, status_code: int, text: str):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8", "replace")
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        import requests
+
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class FakeGeminiResponse:
+    def __init__(self, text: str = None):
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            # What the real client does when the candidate was blocked / empty
+            raise ValueError("The `response.text` quick accessor only works when the response contains a valid `Part`, "
+                             "but none was returned. Check the `candidate.safety_ratings` to see if the response was blocked.")
+        return self._text
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str, injector):
+        self.model_name = model_name
+        self.injector = injector
+
+    def generate_content(self, prompt, generation_config=None, request_options=None, **kwargs):
+        return self.injector.generate(self.model_name, prompt, (request_options or {}).get("timeout"))
+
+
+class FakeRequests:
+    """Stands in for the requests module at the scrapers' call sites (requests.get)."""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def get(self, url, **kwargs):
+        return self.injector.http_get(url, **kwargs)
+
+    @property
+    def exceptions(self):
+        import requests
+
+        return requests.exceptions
+
+
+class FaultInjector:
+    def __init__(self, profile: dict, seed=None):
+        self.profile = profile
+        self.gemini = DependencyFaults(profile.get("gemini"), GEMINI_OUTCOMES)
+        self.web = DependencyFaults(profile.get("web"), WEB_OUTCOMES)
+        seed = seed if seed is not None else profile.get("seed")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = Counter() # (dependency, outcome) -> calls
+
+    def _draw(self, dependency: str, faults: DependencyFaults):
+        with self._lock:
+            outcome, latency = faults.draw(self._rng)
+            detail = self._rng.random()
+        return outcome, latency, detail
+
+    def _settle(self, dependency: str, outcome: str, latency: float, timeout) -> str:
+        """
+        Waits out the call and counts what the caller actually gets: any call whose
+        latency outlasts the caller's timeout ends as "timeout", whatever was drawn.
+        """
+        if outcome == "timeout":
+            latency = timeout if timeout is not None else HANG_SECONDS
+        if not self._wait(latency, timeout):
+            outcome = "timeout"
+        with self._lock:
+            self.counts[(dependency, outcome)] += 1
+        return outcome
+
+    @staticmethod
+    def _wait(latency: float, timeout):
+        """Sleeps for the call's latency; False if the caller's timeout expired first."""
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(latency)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {}
+            for (dependency, outcome), count in sorted(self.counts.items()):
+                report.setdefault(dependency, {})[outcome] = count
+            return report
+
+    # --- Gemini ---
+
+    def model(self, model_name: str) -> FakeGenerativeModel:
+        return FakeGenerativeModel(model_name, self)
+
+    def generate(self, model_name: str, prompt, timeout=None) -> FakeGeminiResponse:
+        from google.api_core import exceptions as api_exceptions
+
+        outcome, latency, _ = self._draw("gemini", self.gemini)
+        outcome = self._settle("gemini", outcome, latency, timeout)
+        if outcome == "timeout":
+            raise api_exceptions.DeadlineExceeded("504 Deadline Exceeded")
+        if outcome == "quota":
+            raise api_exceptions.ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        if outcome == "error":
+            raise api_exceptions.InternalServerError("500 An internal error has occurred.")
+        if outcome == "blocked":
+            return FakeGeminiResponse(None)
+        words = len(str(prompt).split())
+        return FakeGeminiResponse(f"[offline {model_name}] Stand-in answer for a {words}-word prompt.")
+
+    # --- HTTP ---
+
+    def http_get(self, url: str, timeout=None, **kwargs) -> FakeResponse:
+        import requests
+
+        # requests' timeout may be (connect, read); the read part is what a slow page hits
+        if isinstance(timeout, (tuple, list)):
+            timeout = timeout[-1]
+        outcome, latency, detail = self._draw("web", self.web)
+        outcome = self._settle("web", outcome, latency, timeout)
+        if outcome == "timeout":
+            raise requests.exceptions.ReadTimeout(f"HTTPSConnectionPool(host={urlsplit(url).netloc!r}): Read timed out. (read timeout={timeout})")
+        if outcome == "error":
+            raise requests.exceptions.ConnectionError(f"HTTPSConnectionPool(host={urlsplit(url).netloc!r}): Max retries exceeded (Connection reset by peer)")
+        if outcome == "status":
+            status = (403, 500, 502, 503)[int(detail * 4)]
+            return FakeResponse(url, status, f"<html><body><h1>{status}</h1></body></html>")
+        html = fake_page(url)
+        if outcome == "malformed":
+            html = malform(html, MALFORMED_KINDS[int(detail * len(MALFORMED_KINDS))], detail)
+        return FakeResponse(url, 200, html)
+
+
+def fake_page(url: str) -> str:
+    """Plausible HTML for a Google site: search, a notifications / circulars list or a content page."""
+    parts = urlsplit(url)
+    if "google." in parts.netloc:
+        query = parse_qs(parts.query).get("q", [""])[0]
+        results = "".join(
+            f'<div class="g"><div class="yuRUbf"><a href="{link}"><h3>{query} - SV University</h3></a></div></div>'
+            for link in SITE_PAGES[:3]
+        )
+        return f"<html><body><div id=\"search\">{results}</div></body></html>"
+    if "notification" in parts.path or "circular" in parts.path or "exam" in parts.path:
+        today = date.today()
+        rows = "".join(
+            f"<tr><td>{n}</td><td><a href=\"/wp-content/uploads/notice-{n}.pdf\">Notification regarding "
+            f"{('examination schedule', 'admission counselling', 'revaluation results', 'fee payment')[n % 4]} no. {n}"
+            f"</a></td><td>{(today - timedelta(days=3 * n)).strftime('%d-%m-%Y')}</td></tr>"
+            for n in range(1, 16)
+        )
+        return f"<html><body><main><table>{rows}</table></main></body></html>"
+    paragraphs = "".join(
+        f"<p>Sri Venkateswara University {parts.path.strip('/') or 'home'} information, paragraph {n}: "
+        f"eligibility, fees, dates and contacts are published by the concerned office.</p>"
+        for n in range(1, 11)
+    )
+    return f"<html><head><title>SV University</title></head><body><main>{paragraphs}</main></body></html>"
+
+
+def malform(html: str, kind: str, detail: float) -> str:
+    if kind == "truncated":
+        return html[:max(1, int(len(html) * detail))]
+    if kind == "captcha":
+        return ("<html><body><div id=\"captcha-form\">Our systems have detected unusual traffic from your "
+                "computer network.</div></body></html>")
+    if kind == "tag_soup":
+        return html.replace("</p>", "<p><div").replace("</td>", "<td <").replace("</a>", "")
+    if kind == "empty":
+        return ""
+    return json.dumps({"error": "upstream returned JSON", "code": 520})
+
+
+_injector = None
+_injector_lock = threading.Lock()
+
+
+def get_injector():
+    """The process-wide FaultInjector, or None when FAULT_INJECTION is off."""
+    global _injector
+    if not FAULT_INJECTION:
+        return None
+    with _injector_lock:
+        if _injector is None:
+            seed = int(FAULT_INJECTION_SEED) if FAULT_INJECTION_SEED else None
+            _injector = FaultInjector(load_profile(FAULT_INJECTION), seed=seed)
+            print(f"FAULT INJECTION ON: Gemini and web fetches use the offline {FAULT_INJECTION!r} profile")
+        return _injector
+
+
+def http():
+    """requests, or its fault-injecting stand-in; only .get and .exceptions are used."""
+    injector = get_injector()
+    if injector is not None:
+        return FakeRequests(injector)
+    import requests
+
+    return requests
@@ -0,0 +1,281 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+from shared_state import FileLock, atomic_write_bytes, file_signature, state_path
+
+# Compact, memory-mappable copy of the searchable KB built from data.json.
+# data.json stays the editable source of truth; the snapshot is a derived build
+# artifact that workers map read-only, so they all share the same page cache.
+#
+# Layout (native byte order, every section 4-byte aligned):
+#   header   magic, data.json mtime_ns + size, counts and section offsets
+#   strings  uint32 offsets[n_strings + 1] followed by the UTF-8 blob; every
+#            distinct string (answers, categories, sources...) is stored once
+#   docs     uint32[n_docs][DOC_FIELDS], each field an index into the string table
+#
+# The retrieval "index" is the precomputed lowercase search text / question and
+# normalized question per document, so scoring runs straight over the mapped
+# bytes with mmap.find() instead of rebuilding and lowercasing the KB per request.
+MAGIC = b"SVUKB1" + (b"LE" if sys.byteorder == "little" else b"BE")
+HEADER = struct.Struct("=8sqqIIIII")
+DOC_FIELDS = ("id", "question", "answer", "category", "source", "search_text", "question_lower", "question_normalized")
+NO_STRING = 0xFFFFFFFF
+
+KB_SNAPSHOT_FILE = os.getenv("KB_SNAPSHOT_FILE", "data.kbsnap")
+
+
+def build_searchable_docs(data):
+    searchable_docs = []
+
+    # 1. FAQs
+    if "faqs" in data and isinstance(data["faqs"], list):
+        searchable_docs.extend(data["faqs"])
+
+    # 2. Facilities
+    if "facilities" in data and isinstance(data["facilities"], list):
+        for item in data["facilities"]:
+            searchable_docs.append({
+                "question": f"Facility: {item.get('name')} - {item.get('location')}",
+                "answer": f"{item.get('name')} is located at {item.get('location')}. {item.get('description')}"
+            })
+
+    # 3. Academic Programs
+    if "academic_programs" in data and isinstance(data["academic_programs"], list):
+        for item in data["academic_programs"]:
+            searchable_docs.append({
+                "question": f"Program: {item.get('name')}",
+                "answer": f"{item.get('name')}. {item.get('description')} Fee: {item.get('fee')}"
+            })
+
+    # 4. Placements
+    if "placements" in data and isinstance(data["placements"], dict):
+        p = data["placements"]
+        searchable_docs.append({
+            "question": "Placement details and top recruiters",
+            "answer": f"{p.get('summary')} Top Recruiters: {', '.join(p.get('top_recruiters', []))}"
+        })
+
+    # 5. Syllabi
+    if "syllabi" in data and isinstance(data["syllabi"], dict):
+        searchable_docs.append({
+            "question": "Syllabus information",
+            "answer": data["syllabi"].get("summary", "")
+        })
+
+    return searchable_docs
+
+
+def normalize_question(text: str) -> str:
+    # Lowercase, drop punctuation and collapse whitespace so "What is X?" == "what is x"
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def _align(buf: bytearray):
+    buf.extend(b"\0" * (-len(buf) % 4))
+
+
+def build_snapshot_bytes(data, source_signature=(0, 0)) -> bytes:
+    strings = []
+    interned = {}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        value = str(value)
+        idx = interned.get(value)
+        if idx is None:
+            idx = interned[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    doc_table = array("I")
+    docs = build_searchable_docs(data)
+    for entry in docs:
+        q_text = entry.get('question', '')
+        a_text = entry.get('answer', '')
+        cat_text = entry.get('category', '')
+        doc_table.extend([
+            intern(entry.get('id')),
+            intern(q_text),
+            intern(a_text),
+            intern(entry.get('category')),
+            intern(entry.get('source')),
+            intern((q_text + " " + a_text + " " + cat_text).lower()),
+            intern(q_text.lower()),
+            intern(normalize_question(q_text)),
+        ])
+
+    offsets = array("I", [0])
+    blob = bytearray()
+    for value in strings:
+        blob.extend(value.encode("utf-8"))
+        offsets.append(len(blob))
+
+    out = bytearray(HEADER.size)
+    _align(out)
+    offsets_pos = len(out)
+    out.extend(offsets.tobytes())
+    blob_pos = len(out)
+    out.extend(blob)
+    _align(out)
+    docs_pos = len(out)
+    out.extend(doc_table.tobytes())
+
+    HEADER.pack_into(out, 0, MAGIC, source_signature[0], source_signature[1],
+                     len(strings), len(docs), offsets_pos, blob_pos, docs_pos)
+    return bytes(out)
+
+
+def build_snapshot(data_file: str, snapshot_file: str):
+    # Signature is taken before reading so a concurrent edit makes the snapshot stale, not wrong
+    signature = file_signature(data_file)
+    with open(data_file, "r") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"faqs": data}
+    payload = build_snapshot_bytes(data, signature[:2] if signature else (0, 0))
+    atomic_write_bytes(snapshot_file, payload)
+    return payload
+
+
+class KBSnapshot:
+    """
+    Read-only view over a snapshot buffer (an mmap of the snapshot file, or bytes).
+    Strings are decoded lazily, only for documents that are actually returned.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        magic, mtime_ns, size, n_strings, n_docs, offsets_pos, blob_pos, docs_pos = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("not a KB snapshot (or built on a host with different byte order)")
+        self.source_signature = (mtime_ns, size)
+        self.n_docs = n_docs
+        self._blob_pos = blob_pos
+        view = memoryview(buf)
+        self._offsets = view[offsets_pos:offsets_pos + 4 * (n_strings + 1)].cast("I")
+        self._docs = view[docs_pos:docs_pos + 4 * n_docs * len(DOC_FIELDS)].cast("I")
+
+    @classmethod
+    def open(cls, path: str):
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm)
+
+    def __len__(self):
+        return self.n_docs
+
+    def _span(self, string_idx):
+        start = self._blob_pos + self._offsets[string_idx]
+        return start, self._blob_pos + self._offsets[string_idx + 1]
+
+    def string(self, string_idx):
+        if string_idx == NO_STRING:
+            return None
+        start, end = self._span(string_idx)
+        return bytes(self.buf[start:end]).decode("utf-8")
+
+    def field(self, doc_idx, name):
+        return self.string(self._docs[doc_idx * len(DOC_FIELDS) + DOC_FIELDS.index(name)])
+
+    def document(self, doc_idx):
+        base = doc_idx * len(DOC_FIELDS)
+        entry = {}
+        for offset, name in enumerate(DOC_FIELDS[:5]):
+            value = self.string(self._docs[base + offset])
+            if value is not None:
+                entry[name] = value
+        return entry
+
+    def score_documents(self, user_tokens):
+        """
+        Keyword score per document, same rules as the original matcher:
+        +1 if a token occurs in question/answer/category, +1 more if it occurs in the question.
+        Yields (doc_idx, score) for every document with score > 0.
+        """
+        needles = [t.encode("utf-8") for t in user_tokens]
+        search_field = DOC_FIELDS.index("search_text")
+        question_field = DOC_FIELDS.index("question_lower")
+        find = self.buf.find
+        stride = len(DOC_FIELDS)
+        for doc_idx in range(self.n_docs):
+            base = doc_idx * stride
+            s_start, s_end = self._span(self._docs[base + search_field])
+            q_start, q_end = self._span(self._docs[base + question_field])
+            score = 0
+            for needle in needles:
+                if find(needle, s_start, s_end) != -1:
+                    score += 1
+                if find(needle, q_start, q_end) != -1:
+                    score += 1
+            if score > 0:
+                yield doc_idx, score
+
+
+class KBSnapshotCache:
+    """
+    Keeps the current snapshot mapped for this worker. get() remaps when another
+    worker has published a new snapshot file and rebuilds it when data.json is newer.
+    """
+
+    def __init__(self, data_file: str, snapshot_file: str = KB_SNAPSHOT_FILE):
+        self.data_file = data_file
+        self.snapshot_file = snapshot_file
+        self._lock = FileLock(state_path("kb_snapshot.lock"))
+        self._snapshot = None
+        self._file_signature = None
+        self._failed_source = None
+
+    def get(self) -> KBSnapshot:
+        signature = file_signature(self.snapshot_file)
+        if signature is not None and signature != self._file_signature:
+            try:
+                self._snapshot = KBSnapshot.open(self.snapshot_file)
+                self._file_signature = signature
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable KB snapshot {self.snapshot_file}: {e}")
+
+        source = file_signature(self.data_file)
+        source = source[:2] if source else (0, 0)
+        if self._snapshot is None or (self._snapshot.source_signature != source and source != self._failed_source):
+            self._rebuild(source)
+        return self._snapshot
+
+    def _rebuild(self, source):
+        if not os.path.exists(self.data_file):
+            self._snapshot = KBSnapshot(build_snapshot_bytes({"faqs": []}))
+            return
+        try:
+            # Only one worker writes the file; the others use a private in-memory build meanwhile
+            if self._lock.try_acquire():
+                try:
+                    build_snapshot(self.data_file, self.snapshot_file)
+                finally:
+                    self._lock.release()
+                self._snapshot = KBSnapshot.open(self.snapshot_file)
+                self._file_signature = file_signature(self.snapshot_file)
+                print(f"Rebuilt KB snapshot {self.snapshot_file} ({len(self._snapshot)} documents)")
+            else:
+                signature = file_signature(self.data_file)
+                with open(self.data_file, "r") as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    data = {"faqs": data}
+                self._snapshot = KBSnapshot(build_snapshot_bytes(data, signature[:2]))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"KB snapshot rebuild failed: {e}")
+            self._failed_source = source
+            if self._snapshot is None:
+                self._snapshot = KBSnapshot(build_snapshot_bytes({"faqs": []}))
+
+
+if __name__ == "__main__":
+    data_file = sys.argv[1] if len(sys.argv) > 1 else "data.json"
+    snapshot_file = sys.argv[2] if len(sys.argv) > 2 else KB_SNAPSHOT_FILE
+    payload = build_snapshot(data_file, snapshot_file)
+    print(f"Wrote {snapshot_file} ({len(payload)} bytes, {len(KBSnapshot(payload))} documents)")
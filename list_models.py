@@ -1,15 +1,20 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=api_key)
-
-print("Listing available models:")
-try:
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"Model: {m.name}")
-except Exception as e:
-    print(f"Error: {e}")
+def main():
+    import google.generativeai as genai
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    genai.configure(api_key=api_key)
+
+    print("Listing available models:")
+    try:
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                print(f"Model: {m.name}")
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
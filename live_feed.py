@@ -0,0 +1,377 @@
+import asyncio
+import calendar
+import hashlib
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from urllib.parse import urljoin
+
+from fault_injection import http
+
+# Pages polled by the background refresher. The category is attached to every
+# update extracted from the page so the chat endpoint can filter on it.
+LIVE_FEED_PAGES = {
+    "notifications": "https://svuniversity.edu.in/notifications/",
+    "exams": "https://svuniversity.edu.in/exams-circulars/",
+}
+
+# Same keyword routing search_university_website used for direct scraping
+CATEGORY_KEYWORDS = {
+    "notifications": ['notification', 'latest', 'update', 'news'],
+    "exams": ['exam', 'result', 'schedule', 'time table', 'circular'],
+}
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+MAX_ITEMS_PER_PAGE = 100
+# Records are kept across refreshes (deduplicated by id); the oldest are dropped past this
+MAX_RECORDS_PER_CATEGORY = 500
+
+# Words that pick the page/route rather than narrow down the rows
+GENERIC_WORDS = {
+    "latest", "recent", "new", "news", "notification", "notifications", "update", "updates", "circular",
+    "circulars", "exam", "exams", "today", "yesterday", "week", "month", "this", "last", "past", "days",
+    "day", "what", "which", "are", "is", "the", "any", "there", "show", "me", "list", "all", "for", "of",
+    "in", "on", "about", "released", "svu", "university", "please", "tell", "give", "were", "was", "a", "an",
+}
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+MONTH_RE = "|".join(sorted(MONTHS, key=len, reverse=True))
+MONTH_TOKENS = set(MONTHS)
+
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[-./](\d{1,2})[-./](\d{4}|\d{2})\b")
+DAY_MONTH_RE = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+({MONTH_RE})\.?,?\s+(\d{{4}})\b", re.I)
+MONTH_DAY_RE = re.compile(rf"\b({MONTH_RE})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b", re.I)
+
+
+def tokenize(text: str):
+    return set(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def _safe_date(year, month, day):
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(text: str):
+    """First date found in a notification's text as an ISO string; numeric dates are dd-mm-yyyy."""
+    m = NUMERIC_DATE_RE.search(text)
+    if m:
+        d = _safe_date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        if d:
+            return d.isoformat()
+    m = DAY_MONTH_RE.search(text)
+    if m:
+        d = _safe_date(int(m.group(3)), MONTHS[m.group(2).lower()], int(m.group(1)))
+        if d:
+            return d.isoformat()
+    m = MONTH_DAY_RE.search(text)
+    if m:
+        d = _safe_date(int(m.group(3)), MONTHS[m.group(1).lower()], int(m.group(2)))
+        if d:
+            return d.isoformat()
+    return None
+
+
+def date_range_for(query: str, today=None):
+    """
+    Date filter implied by a question, as an inclusive (start, end) pair of ISO
+    strings, or None. Understands today/yesterday, this/last week or month,
+    "last N days", a month name (with optional year) and a bare year.
+    """
+    today = today or date.today()
+    q = query.lower()
+    if "today" in q:
+        return today.isoformat(), today.isoformat()
+    if "yesterday" in q:
+        d = today - timedelta(days=1)
+        return d.isoformat(), d.isoformat()
+    m = re.search(r"\b(?:last|past)\s+(\d{1,3})\s+days?\b", q)
+    if m:
+        return (today - timedelta(days=int(m.group(1)))).isoformat(), today.isoformat()
+    if "this week" in q:
+        return (today - timedelta(days=today.weekday())).isoformat(), today.isoformat()
+    if "last week" in q or "past week" in q:
+        start = today - timedelta(days=today.weekday() + 7)
+        return start.isoformat(), (start + timedelta(days=6)).isoformat()
+    if "this month" in q:
+        return today.replace(day=1).isoformat(), today.isoformat()
+    if "last month" in q or "past month" in q:
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1).isoformat(), end.isoformat()
+    for m in re.finditer(rf"\b({MONTH_RE})\b\.?\s*(\d{{4}})?", q):
+        # "may" is far more often the verb than the month: only next to a year or day number
+        if m.group(1) == "may" and not (m.group(2) or re.match(r"\s*\d", q[m.end():])
+                                        or re.search(r"\d(?:st|nd|rd|th)?\s*$", q[:m.start()])):
+            continue
+        month = MONTHS[m.group(1)]
+        year = int(m.group(2)) if m.group(2) else (today.year if month <= today.month else today.year - 1)
+        last_day = calendar.monthrange(year, month)[1]
+        return date(year, month, 1).isoformat(), date(year, month, last_day).isoformat()
+    m = re.search(r"\b(20\d\d)\b", q)
+    if m:
+        return f"{m.group(1)}-01-01", f"{m.group(1)}-12-31"
+    return None
+
+
+def record_id(category: str, title: str, link: str) -> str:
+    return hashlib.sha1(f"{category}\0{title}\0{link}".encode("utf-8")).hexdigest()[:16]
+
+
+def extract_updates(html: str, url: str, category: str):
+    """
+    Pulls the list of updates out of a notifications / exam-circulars page.
+    Each update becomes a record {"id", "title", "date", "link", "category", "source"};
+    table rows take their date from a date cell, list items / paragraphs from their text.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    main_content = soup.find('main') or soup.find(class_='content') or soup.body
+    if main_content is None:
+        return []
+
+    updates = []
+    seen = set()
+    for item in main_content.find_all(['li', 'p', 'tr']):
+        # A <p> inside a row / list item is already covered by its parent
+        if item.name != 'tr' and item.find_parent(['li', 'tr']) is not None:
+            continue
+
+        if item.name == 'tr':
+            cells = [" ".join(c.get_text(separator=" ").split()) for c in item.find_all(['td', 'th'])]
+            cells = [c for c in cells if c]
+            dates = [parse_date(c) for c in cells]
+            item_date = next((d for d in dates if d), None)
+            # Title is the longest cell that isn't just a date or a serial number
+            text_cells = [c for c, d in zip(cells, dates) if not (d and len(c) <= 20) and not c.isdigit()]
+            title = max(text_cells, key=len) if text_cells else ""
+        else:
+            title = " ".join(item.get_text(separator=" ").split())
+            item_date = parse_date(title)
+
+        if not title or len(title) <= 10: # meaningful text
+            continue
+        if title.lower() in seen:
+            continue
+        seen.add(title.lower())
+
+        anchor = item.find('a', href=True)
+        link = urljoin(url, anchor['href']) if anchor else url
+        updates.append({
+            "id": record_id(category, title, link),
+            "title": title,
+            "date": item_date,
+            "link": link,
+            "category": category,
+            "source": url,
+        })
+        if len(updates) >= MAX_ITEMS_PER_PAGE:
+            break
+    return updates
+
+
+def fetch_updates(url: str, category: str, timeout: int = 10):
+    res = http().get(url, headers=HEADERS, timeout=timeout, verify=False)
+    res.raise_for_status()
+    return extract_updates(res.text, url, category)
+
+
+class LiveFeed:
+    """
+    Incrementally updated store of the university's notifications and circulars.
+    Records are deduplicated by id across refreshes and indexed by token and date,
+    so a question only pulls the matching rows into the prompt.
+    Written by the background refresher, read by the chat endpoint.
+    """
+
+    def __init__(self, pages=None):
+        self.pages = pages or LIVE_FEED_PAGES
+        self.records = {}
+        self.items = []
+        self.index = {}
+        self.date_index = []
+        self.updated_at = {}
+        self._lock = threading.Lock() # guards swapping in a new version (readers)
+        self._write_lock = threading.Lock() # serializes writers
+
+    def refresh(self):
+        # Fetch every page; a failed page keeps its previous records
+        for category in self.pages:
+            try:
+                self.refresh_category(category)
+            except Exception as e:
+                print(f"Live feed refresh failed for {self.pages[category]}: {e}")
+
+    def refresh_category(self, category: str, timeout: float = 10):
+        url = self.pages[category]
+        updates = fetch_updates(url, category, timeout=timeout)
+        added = self.ingest(category, updates)
+        print(f"Live feed: {len(updates)} updates from {url} ({added} new)")
+
+    def ingest(self, category: str, updates, now=None) -> int:
+        now = now or time.time()
+        # A request's direct scrape and the background refresher may ingest at the same
+        # time: serialize copy -> merge -> replace so neither drops the other's rows
+        with self._write_lock:
+            return self._ingest(category, updates, now)
+
+    def _ingest(self, category: str, updates, now) -> int:
+        with self._lock:
+            records = dict(self.records)
+            updated_at = dict(self.updated_at)
+        added = 0
+        for update in updates:
+            existing = records.get(update["id"])
+            if existing:
+                records[update["id"]] = {**existing, "last_seen": now}
+            else:
+                records[update["id"]] = {**update, "first_seen": now, "last_seen": now}
+                added += 1
+
+        # Cap each category, keeping the newest (by date, then by when we first saw it)
+        in_category = sorted((r for r in records.values() if r["category"] == category), key=self._recency, reverse=True)
+        for stale in in_category[MAX_RECORDS_PER_CATEGORY:]:
+            del records[stale["id"]]
+
+        updated_at[category] = now
+        self._replace(records, updated_at)
+        return added
+
+    @staticmethod
+    def _recency(record):
+        return (record.get("date") or "", record.get("first_seen", 0))
+
+    def _replace(self, records, updated_at):
+        # Position order is newest first, so sorting positions also sorts by recency
+        items = sorted(records.values(), key=self._recency, reverse=True)
+        index = {}
+        date_index = []
+        for pos, item in enumerate(items):
+            for token in tokenize(item["title"]):
+                index.setdefault(token, set()).add(pos)
+            if item.get("date"):
+                date_index.append((item["date"], pos))
+        date_index.sort()
+
+        with self._lock:
+            self.records = records
+            self.items = items
+            self.index = index
+            self.date_index = date_index
+            self.updated_at = updated_at
+
+    def to_snapshot(self):
+        with self._lock:
+            return {"records": list(self.records.values()), "updated_at": self.updated_at}
+
+    def load_snapshot(self, snapshot):
+        if not snapshot:
+            return
+        records = {r["id"]: r for r in snapshot.get("records", []) if "id" in r}
+        with self._write_lock:
+            self._replace(records, snapshot.get("updated_at", {}))
+
+    def is_fresh(self, category: str, max_age: float) -> bool:
+        updated = self.updated_at.get(category)
+        return updated is not None and time.time() - updated <= max_age
+
+    def categories_for(self, query: str):
+        lower_query = query.lower()
+        return [c for c, keywords in CATEGORY_KEYWORDS.items() if any(k in lower_query for k in keywords)]
+
+    def search(self, query: str, categories=None, limit: int = 20, today=None):
+        """
+        Returns matching rows in the same {"question", "answer", "category"} shape as local KB
+        documents (plus "date"). Date phrases ("this week", "March 2025") filter on the date
+        index; remaining topic words rank rows by title matches. Without a date phrase or any
+        title match (there is no stemming), the newest rows (in the date range, if any) win.
+        """
+        with self._lock:
+            items = self.items
+            index = self.index
+            date_index = self.date_index
+
+        date_range = date_range_for(query, today)
+        candidates = None
+        if date_range:
+            lo = bisect_left(date_index, (date_range[0], -1))
+            hi = bisect_right(date_index, (date_range[1], len(items)))
+            candidates = {pos for _, pos in date_index[lo:hi]}
+
+        topic = {t for t in tokenize(query) if t not in GENERIC_WORDS and not t.isdigit()}
+        if date_range:
+            topic -= MONTH_TOKENS
+        scores = {}
+        for token in topic:
+            for pos in index.get(token, ()):
+                if candidates is None or pos in candidates:
+                    scores[pos] = scores.get(pos, 0) + 1
+
+        if scores:
+            order = sorted(scores, key=lambda pos: (-scores[pos], pos))
+        elif candidates is not None:
+            order = sorted(candidates)
+        else:
+            order = range(len(items))
+
+        results = []
+        for pos in order:
+            item = items[pos]
+            if categories and item["category"] not in categories:
+                continue
+            prefix = f"{item['date']} - " if item.get("date") else ""
+            results.append({
+                "question": item["title"],
+                "answer": f"{prefix}{item['title']} ({item['link']})",
+                "category": item["category"],
+                "date": item.get("date"),
+                "source": item["source"],
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+async def run_refresher(feed: LiveFeed, interval: float, shared=None, lock=None, poll_interval: float = 30):
+    """
+    Runs for the lifetime of the app; blocking scrapes happen off the event loop.
+    With several workers, only the one holding `lock` scrapes and publishes the feed
+    to `shared` (a SharedJSONFile); the others just pick up the published snapshot.
+    """
+    last_snapshot = None
+    next_refresh = 0.0
+    if shared is not None:
+        # Start from the published records so deduplication carries across restarts
+        last_snapshot = await asyncio.to_thread(shared.get)
+        feed.load_snapshot(last_snapshot)
+    while True:
+        try:
+            if lock is None or lock.try_acquire():
+                if time.time() >= next_refresh:
+                    await asyncio.to_thread(feed.refresh)
+                    if shared is not None:
+                        await asyncio.to_thread(shared.set, feed.to_snapshot())
+                    next_refresh = time.time() + interval
+            elif shared is not None:
+                snapshot = await asyncio.to_thread(shared.get)
+                if snapshot is not last_snapshot:
+                    feed.load_snapshot(snapshot)
+                    last_snapshot = snapshot
+                    # If this worker takes over the lock later, keep the same schedule
+                    if feed.updated_at:
+                        next_refresh = max(feed.updated_at.values()) + interval
+        except Exception as e:
+            print(f"Live feed refresher error: {e}")
+        await asyncio.sleep(min(interval, poll_interval))
+
+
+live_feed = LiveFeed()
@@ -1,19 +1,75 @@
 import os
-import json
-from typing import List, Optional, Union, Dict, Any
+import copy
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Optional, Union
 from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import google.generativeai as genai
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from live_feed import live_feed, run_refresher
+from shared_state import KB_WRITE_LOCK, FileLock, SharedJSONFile, state_path
+from kb_snapshot import KBSnapshotCache, normalize_question
+from admission import AdmissionControlMiddleware, budget_from_env
+from profiling import ProfilingMiddleware
+from conversation import SessionStore
+from static_assets import static_app
+from routing import classify_live_intent, route_query, log_decision, web_cache
+from readiness import Readiness
+from fault_injection import get_injector, http
+
 # 1. Load Environment Variables
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+# Live feed: notifications / exam circulars are scraped in the background every
+# LIVE_FEED_REFRESH_SECONDS (0 disables it) instead of inside user requests.
+LIVE_FEED_REFRESH_SECONDS = float(os.getenv("LIVE_FEED_REFRESH_SECONDS", "900"))
+# Feed data older than this is treated as missing and the page is scraped directly
+LIVE_FEED_MAX_AGE_SECONDS = float(os.getenv("LIVE_FEED_MAX_AGE_SECONDS", str(3 * max(LIVE_FEED_REFRESH_SECONDS, 300))))
+
+@asynccontextmanager
+async def lifespan(app):
+    # Nothing heavy before the yield: the KB snapshot, Gemini client and scraper
+    # libraries are warmed in the background and gate /ready, not /health
+    readiness.start()
+    sessions.prune()
+    refresher = None
+    if LIVE_FEED_REFRESH_SECONDS > 0:
+        # One worker per host scrapes; the rest read its published snapshot
+        refresher = asyncio.create_task(run_refresher(
+            live_feed,
+            LIVE_FEED_REFRESH_SECONDS,
+            shared=SharedJSONFile(state_path("live_feed.json")),
+            lock=FileLock(state_path("live_feed.lock")),
+        ))
+    yield
+    await readiness.stop()
+    if refresher:
+        refresher.cancel()
+        try:
+            await refresher
+        except asyncio.CancelledError:
+            pass
+
+# Server-side chat sessions (sliding window + summary), shared by all workers
+sessions = SessionStore()
 
 # 2. Initialize App
-app = FastAPI(title="SV University Campus Assistant")
+app = FastAPI(title="SV University Campus Assistant", lifespan=lifespan)
+
+# Each chat can trigger scrapes plus up to two Gemini calls: cap per-client rate and
+# concurrency so a burst gets fast 429/503s instead of exhausting the worker and quota.
+app.add_middleware(
+    AdmissionControlMiddleware,
+    budgets=[budget_from_env("CHAT", "/api/chat", rate_per_minute=20, burst=5, concurrency=16, max_queue=32)],
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,162 +79,236 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in sampling profiler (PROFILING_TOKEN); outermost so it sees queueing time too
+app.add_middleware(ProfilingMiddleware, app_name="main")
+
 # 3. Data Management
 DATA_FILE = "data.json"
 
+# Parsed KB shared by every request in this worker. It is re-read only when
+# data.json's signature changes, so an admin write in any worker (atomic replace
+# via save_data) invalidates the copy held by all the others.
+_kb_file = SharedJSONFile(DATA_FILE, default={"faqs": []})
+
 def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"faqs": []} # Return default structure
-    with open(DATA_FILE, "r") as f:
+    # Read-only view: callers that modify the KB must use load_data_for_update()
+    content = _kb_file.get()
+    if isinstance(content, list):
+        return {"faqs": content} # Backward compatibility
+    return content
+
+def load_data_for_update():
+    return copy.deepcopy(load_data())
+
+# Admin edits are read-modify-write: hold one lock (across threads and workers)
+# from load to save, or two concurrent edits would each drop the other's change.
+_kb_write_lock = threading.Lock()
+_kb_file_lock = FileLock(state_path(KB_WRITE_LOCK))
+
+@contextmanager
+def kb_update():
+    """Yields a private copy of the latest KB while holding the write lock; call save_data() inside."""
+    with _kb_write_lock:
+        while not _kb_file_lock.try_acquire():
+            time.sleep(0.05)
         try:
-            content = json.load(f)
-            if isinstance(content, list):
-                return {"faqs": content} # Backward compatibility
-            return content
-        except json.JSONDecodeError:
-            return {"faqs": []}
+            yield load_data_for_update()
+        finally:
+            _kb_file_lock.release()
 
 def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    _kb_file.set(data, indent=2)
+    # Rebuild the binary snapshot right away; other workers remap it on their next request
+    _kb_snapshots.get()
+
+# Chat retrieval reads a compact memory-mapped snapshot of the KB instead of
+# parsing data.json (see kb_snapshot.py); it is rebuilt whenever data.json changes.
+_kb_snapshots = KBSnapshotCache(DATA_FILE)
 
 # 4. RAG Logic: find_relevant_context
-def find_relevant_context(user_query: str):
-    data = load_data()
-    searchable_docs = []
-    
-    # 1. FAQs
-    if "faqs" in data and isinstance(data["faqs"], list):
-        searchable_docs.extend(data["faqs"])
-        
-    # 2. Facilities
-    if "facilities" in data and isinstance(data["facilities"], list):
-        for item in data["facilities"]:
-            searchable_docs.append({
-                "question": f"Facility: {item.get('name')} - {item.get('location')}",
-                "answer": f"{item.get('name')} is located at {item.get('location')}. {item.get('description')}"
-            })
-            
-    # 3. Academic Programs
-    if "academic_programs" in data and isinstance(data["academic_programs"], list):
-        for item in data["academic_programs"]:
-            searchable_docs.append({
-                "question": f"Program: {item.get('name')}",
-                "answer": f"{item.get('name')}. {item.get('description')} Fee: {item.get('fee')}"
-            })
-
-    # 4. Placements
-    if "placements" in data and isinstance(data["placements"], dict):
-        p = data["placements"]
-        searchable_docs.append({
-            "question": "Placement details and top recruiters",
-            "answer": f"{p.get('summary')} Top Recruiters: {', '.join(p.get('top_recruiters', []))}"
-        })
-        
-    # 5. Syllabi
-    if "syllabi" in data and isinstance(data["syllabi"], dict):
-        searchable_docs.append({
-            "question": "Syllabus information",
-            "answer": data["syllabi"].get("summary", "")
-        })
+# FAQ shortcut: if the top FAQ question is a near-exact match for the user's
+# message (and clearly beats the runner-up), answer from the KB and skip the LLM.
+FAQ_SHORTCUT_THRESHOLD = float(os.getenv("FAQ_SHORTCUT_THRESHOLD", "0.9"))
+FAQ_SHORTCUT_MARGIN = float(os.getenv("FAQ_SHORTCUT_MARGIN", "0.1"))
+
+def question_similarity(a: str, b: str, floor: float = 0.0) -> float:
+    # 0.0 - 1.0 similarity between two already normalized questions.
+    # Pairs whose cheap upper bound is below `floor` can't be near-exact matches and score 0.0.
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+        return 0.0
+    return matcher.ratio()
+
+def rank_documents(user_query: str):
+    """
+    Scores every searchable document against the query.
+    Returns a list of (score, confidence, entry) sorted by score (descending), where
+    score is the keyword match count and confidence is how closely the entry's
+    question matches the whole query (0.0 - 1.0, or 0.0 if it is nowhere near a shortcut).
+    """
+    snapshot = _kb_snapshots.get()
 
     user_tokens = user_query.lower().split()
-    relevant_chunks = []
+    normalized_query = normalize_question(user_query)
+    ranked = []
     
-    # Simple keyword matching algorithm
-    for entry in searchable_docs:
-        # Ensure keys exist
-        q_text = entry.get('question', '')
-        a_text = entry.get('answer', '')
-        cat_text = entry.get('category', '')
-        
-        # Boost matches in Question
-        text_to_search = (q_text + " " + a_text + " " + cat_text).lower()
-        
-        score = 0
-        for token in user_tokens:
-            if token in text_to_search:
-                score += 1
-            if token in q_text.lower(): # Bonus for matching question directly
-                score += 1
-        
-        if score > 0:
-            # Add category prefix to the chunk for better LLM context
-            prefix = f"[{cat_text}] " if cat_text else ""
-            relevant_chunks.append((score, f"{prefix}Q: {q_text}\nA: {a_text}"))
+    # Simple keyword matching algorithm (runs over the mapped snapshot, see kb_snapshot.py)
+    # Only confidences that could decide the FAQ shortcut need to be exact
+    confidence_floor = FAQ_SHORTCUT_THRESHOLD - FAQ_SHORTCUT_MARGIN
+    for doc_idx, score in snapshot.score_documents(user_tokens):
+        confidence = question_similarity(normalized_query, snapshot.field(doc_idx, "question_normalized"), confidence_floor)
+        ranked.append((score, confidence, snapshot.document(doc_idx)))
     
-    # Sort by score (descending) and return top 5
-    relevant_chunks.sort(key=lambda x: x[0], reverse=True)
-    top_matches = [chunk[1] for chunk in relevant_chunks[:5]]
+    ranked.sort(key=lambda x: x[0], reverse=True)
+    return ranked
+
+def format_chunk(entry):
+    # Add category prefix to the chunk for better LLM context
+    cat_text = entry.get('category', '')
+    prefix = f"[{cat_text}] " if cat_text else ""
+    return f"{prefix}Q: {entry.get('question', '')}\nA: {entry.get('answer', '')}"
+
+def find_relevant_context(user_query: str, ranked=None):
+    if ranked is None:
+        ranked = rank_documents(user_query)
+    
+    # Return top 5 by score
+    top_matches = [format_chunk(entry) for _, _, entry in ranked[:5]]
     
     return "\n\n".join(top_matches)
 
+def faq_key(entry):
+    return normalize_question(entry.get('question', '')), str(entry.get('answer', '')).strip()
+
+def find_faq_shortcut(user_query: str, ranked=None):
+    """
+    Returns the stored answer when one KB question is a near-exact match for the
+    user's message and clearly beats the runner-up, otherwise None.
+    """
+    if ranked is None:
+        ranked = rank_documents(user_query)
+    if not ranked:
+        return None
+
+    by_confidence = sorted(ranked, key=lambda x: x[1], reverse=True)
+    _, top_confidence, top_entry = by_confidence[0]
+    # Entries repeating the top question with the same answer are one FAQ, not a competitor
+    top_key = faq_key(top_entry)
+    runner_up = next((confidence for _, confidence, entry in by_confidence[1:] if faq_key(entry) != top_key), 0.0)
+
+    if top_confidence < FAQ_SHORTCUT_THRESHOLD:
+        return None
+    # An exact question match only loses to another exact match with a different answer
+    if top_confidence - runner_up < FAQ_SHORTCUT_MARGIN and not (top_confidence == 1.0 > runner_up):
+        return None
+    if not top_entry.get('answer'):
+        return None
+    return top_entry
+
 # 5. Gemini AI Configuration
 # Using verified working model alias
-model = genai.GenerativeModel('models/gemini-2.5-flash-lite') 
+PRIMARY_MODEL = 'models/gemini-2.5-flash-lite'
+FALLBACK_MODEL = 'gemini-pro-latest'
+
+# google.generativeai (grpc + protobuf) takes seconds to import, so it is imported
+# and configured on first use - normally by the readiness warm-up, not a request.
+# With FAULT_INJECTION set, an offline stand-in is used instead (fault_injection.py).
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(name: str = PRIMARY_MODEL):
+    with _models_lock:
+        if name not in _models and get_injector() is not None:
+            _models[name] = get_injector().model(name)
+        if name not in _models:
+            import google.generativeai as genai
+            if not _models:
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _models[name] = genai.GenerativeModel(name)
+        return _models[name]
 
 # --- Dynamic Web Search & Scraping ---
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import quote_plus
 
-def search_university_website(query: str):
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+def warm_scraper():
+    # requests + bs4 are only needed for live-feed / web lookups
+    import requests, bs4
+
+# Background warm-ups behind /ready (see readiness.py)
+readiness = Readiness()
+readiness.add("kb_snapshot", lambda: _kb_snapshots.get())
+readiness.add("gemini", get_model)
+readiness.add("scraper", warm_scraper)
+
+# Scrapes run on their own bounded pool, not the default executor that local retrieval
+# (rank_documents) uses: a cancelled asyncio task can't stop its thread, so abandoned
+# scrapes must not be able to queue the FAQ path behind them. Each HTTP request's
+# timeout is also cut to what is left of the caller's deadline.
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "8"))
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "5"))
+_scrape_pool = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+
+def request_timeout(deadline: Optional[float]) -> float:
+    # 0.0 once the deadline has passed: callers skip the request
+    if deadline is None:
+        return SCRAPE_TIMEOUT_SECONDS
+    return min(SCRAPE_TIMEOUT_SECONDS, remaining(deadline))
+
+def search_university_website(query: str, deadline: Optional[float] = None):
     """
     Searches svuniversity.edu.in. 
     1. Checks for specific keywords to scrape known pages directly (Notifications, Exams).
     2. Falls back to Google Search for other queries.
     """
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    
+    return search_live_pages(query, deadline) or search_google_site(query, deadline)
+
+def search_live_pages(query: str, deadline: Optional[float] = None):
+    """
+    Strategy 1 on its own: rows from the notifications / exam circulars store for
+    keyword-matched queries, with date and topic filters applied by the store.
+    """
     extracted_content = ""
     
-    # --- Strategy 1: Direct Page Scraping based on Keywords ---
-    direct_urls = []
-    lower_query = query.lower()
-    
-    if any(k in lower_query for k in ['notification', 'latest', 'update', 'news']):
-        direct_urls.append("https://svuniversity.edu.in/notifications/")
-        
-    if any(k in lower_query for k in ['exam', 'result', 'schedule', 'time table', 'circular']):
-        direct_urls.append("https://svuniversity.edu.in/exams-circulars/")
-        
-    for url in direct_urls:
-        try:
-            print(f"Direct scraping: {url}")
-            res = requests.get(url, headers=headers, timeout=10, verify=False)
-            if res.status_code == 200:
-                soup = BeautifulSoup(res.text, 'html.parser')
-                
-                # Extract links/headlines from these pages.
-                # Usually these pages have lists of links.
-                # We'll try to find decent text chunks or lists.
-                
-                # Assumption: Notifications are often in tables or lists (ul/li) or div rows.
-                # We grab text from the main content area.
-                main_content = soup.find('main') or soup.find(class_='content') or soup.body
-                
-                # Extract text from the first 15 list items or paragraphs
-                items = main_content.find_all(['li', 'p', 'tr'])
-                text_chunk = []
-                for item in items[:20]: # First 20 items
-                    t = item.get_text().strip()
-                    if t and len(t) > 10: # meaningful text
-                        text_chunk.append(t)
-                
-                if text_chunk:
-                   extracted_content += f"\n**Source:** {url}\n**Relevant Updates:**\n" + "\n- ".join(text_chunk) + "\n\n"
-        except Exception as e:
-            print(f"Error direct scraping {url}: {e}")
+    # --- Strategy 1: Live feed / Direct Page Scraping based on Keywords ---
+    # Pages kept fresh by the background refresher are answered from memory;
+    # only stale or never-fetched pages are scraped (into the store) inside the request.
+    for category in live_feed.categories_for(query):
+        if not live_feed.is_fresh(category, LIVE_FEED_MAX_AGE_SECONDS) and request_timeout(deadline) > 0:
+            try:
+                print(f"Direct scraping: {live_feed.pages[category]}")
+                live_feed.refresh_category(category, timeout=request_timeout(deadline))
+            except Exception as e:
+                print(f"Error direct scraping {live_feed.pages[category]}: {e}")
+                continue
+        updates = live_feed.search(query, categories=[category])
+        if updates:
+            url = live_feed.pages[category]
+            extracted_content += f"\n**Source:** {url}\n**Relevant Updates:**\n" + "\n".join(f"- {u['answer']}" for u in updates) + "\n\n"
+
+    return extracted_content or None
+
+def search_google_site(query: str, deadline: Optional[float] = None):
+    """Strategy 2 on its own: Google site: search plus the top two result pages (slow)."""
+    from bs4 import BeautifulSoup
 
-    if extracted_content:
-        return extracted_content
+    requests = http() # the real module, or the FAULT_INJECTION stand-in
+    headers = HEADERS
+    extracted_content = ""
 
     # --- Strategy 2: Fallback to Search ---
     try:
         search_query = f"site:svuniversity.edu.in {query}"
         url = f"https://www.google.com/search?q={quote_plus(search_query)}"
         
-        res = requests.get(url, headers=headers, timeout=5)
+        if request_timeout(deadline) <= 0:
+            return None
+        res = requests.get(url, headers=headers, timeout=request_timeout(deadline))
         soup = BeautifulSoup(res.text, 'html.parser')
         
         links = []
@@ -199,8 +329,10 @@ def search_university_website(query: str):
         print(f"Found fallback links: {links}")
         
         for link in links:
+            if request_timeout(deadline) <= 0:
+                break
             try:
-                page_res = requests.get(link, headers=headers, timeout=5, verify=False)
+                page_res = requests.get(link, headers=headers, timeout=request_timeout(deadline), verify=False)
                 page_soup = BeautifulSoup(page_res.text, 'html.parser')
                 paragraphs = page_soup.find_all('p')
                 text = " ".join([p.get_text() for p in paragraphs[:8]])
@@ -218,6 +350,7 @@ def search_university_website(query: str):
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 class FAQItem(BaseModel):
     id: Optional[Union[str, int]] = None
@@ -225,32 +358,7 @@ class FAQItem(BaseModel):
     answer: str
     category: Optional[str] = "General"
 
-@app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
-    user_query = request.message
-    
-    # Step 1: Check Local Context (Fast & Reliable)
-    local_context = find_relevant_context(user_query)
-    
-    # Step 2: Dynamic Web Search (If local context is weak or user asks for specific live info)
-    # We always fetch web content if the answer isn't obvious, to ensure freshness.
-    # Optimization: Only search web if local context score is low or query implies "news/latest"
-    web_context = ""
-    if "latest" in user_query.lower() or "news" in user_query.lower() or len(local_context) < 50:
-        print("Performing live web search...")
-        web_context = search_university_website(user_query)
-    
-    combined_context = ""
-    if local_context:
-        combined_context += f"**Local Database Info:**\n{local_context}\n\n"
-    if web_context:
-        combined_context += f"**Live Website Info:**\n{web_context}\n\n"
-    
-    if not combined_context:
-        combined_context = "No relevant information found in local database or on the official website."
-
-    # Step 3: System Prompt
-    system_instruction = """
+SYSTEM_INSTRUCTION = """
     You are 'CampusConnect AI', a helpful assistant for Sri Venkateswara University. 
     You have access to both a local database and real-time information scraped from the official website.
     Always prioritize the **Live Website Info** if it appears more recent or relevant.
@@ -261,23 +369,186 @@ async def chat_endpoint(request: ChatRequest):
     "I'm sorry, I couldn't find that specific information on the SVU website or in my database. Please check https://svuniversity.edu.in/ directly."
     Do not make up facts.
     """
+
+# End-to-end budget for /api/chat. Retrieval, scraping and generation run against one
+# deadline; context that hasn't arrived by then is simply left out of the prompt.
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "15"))
+# Part of the deadline kept back for generation; web context may use the rest
+GENERATION_RESERVE_SECONDS = float(os.getenv("GENERATION_RESERVE_SECONDS", "6"))
+# If web context is still pending after this long, draft an answer from local context in parallel
+DRAFT_AFTER_SECONDS = float(os.getenv("DRAFT_AFTER_SECONDS", "2"))
+
+def build_prompt(local_context, web_context, history, user_query):
+    combined_context = ""
+    if local_context:
+        combined_context += f"**Local Database Info:**\n{local_context}\n\n"
+    if web_context:
+        combined_context += f"**Live Website Info:**\n{web_context}\n\n"
     
-    prompt = f"{system_instruction}\n\nContext:\n{combined_context}\n\nUser Question: {user_query}"
+    if not combined_context:
+        combined_context = "No relevant information found in local database or on the official website."
+
+    # Bounded history (recent turns + summary of older ones) so follow-ups make sense
+    history_block = f"Conversation so far:\n{history}\n\n" if history else ""
+    return f"{SYSTEM_INSTRUCTION}\n\nContext:\n{combined_context}\n\n{history_block}User Question: {user_query}"
+
+def fetch_web_context(query: str, route: str, deadline: Optional[float] = None):
+    # Blocking; runs on _scrape_pool so it can overlap local retrieval and drafting
+    if route == "live_feed":
+        return search_live_pages(query, deadline)
+    cached = web_cache.get(query)
+    if cached is not None:
+        return cached
+    print("Performing live web search...")
+    result = search_university_website(query, deadline)
+    if result:
+        web_cache.set(query, result)
+    return result
+
+def start_web_fetch(query: str, route: str, deadline: float):
+    # Cancelling the returned future drops the scrape if it hasn't started yet
+    return asyncio.get_running_loop().run_in_executor(_scrape_pool, fetch_web_context, query, route, deadline)
 
-    # Step 4: Generate Response
+def speculative_route(query: str):
+    # Decided from the text alone, before local retrieval has finished
+    if classify_live_intent(query):
+        return "live_feed" if live_feed.categories_for(query) else "web"
+    return None
+
+def remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+async def generate_answer(prompt: str, deadline: float):
+    """Gemini Flash, then the Pro fallback, both bounded by the chat deadline. Returns text or None."""
     try:
-        response = model.generate_content(prompt)
-        return {"response": response.text}
+        response = await asyncio.wait_for(
+            asyncio.to_thread(get_model().generate_content, prompt, request_options={"timeout": remaining(deadline)}),
+            timeout=remaining(deadline))
+        return response.text
     except Exception as e_flash:
-        print(f"Gemini Flash Error: {e_flash}")
-        try:
-            print("Attempting fallback to gemini-pro-latest...")
-            fallback_model = genai.GenerativeModel('gemini-pro-latest')
-            response = fallback_model.generate_content(prompt)
-            return {"response": response.text}
-        except Exception as e_pro:
-            print(f"Fallback Error: {e_pro}")
-            return {"response": f"**Network Unavailable**\n\nI tried to search the web but couldn't connect. Here is what I found locally:\n\n{local_context}"}
+        print(f"Gemini Flash Error: {e_flash!r}")
+    if remaining(deadline) <= 0:
+        return None
+    try:
+        print("Attempting fallback to gemini-pro-latest...")
+        fallback_model = get_model(FALLBACK_MODEL)
+        response = await asyncio.wait_for(
+            asyncio.to_thread(fallback_model.generate_content, prompt, request_options={"timeout": remaining(deadline)}),
+            timeout=remaining(deadline))
+        return response.text
+    except Exception as e_pro:
+        print(f"Fallback Error: {e_pro!r}")
+        return None
+
+async def wait_for_task(task, timeout: float):
+    # Waits without cancelling the task; None if it isn't done in time or failed
+    if task is None:
+        return None
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+    except asyncio.TimeoutError:
+        return None
+    except Exception as e:
+        print(f"Context task failed: {e!r}")
+        return None
+
+def cancel(*tasks):
+    for task in tasks:
+        if task is not None and not task.done():
+            task.cancel()
+
+@app.post("/api/chat")
+async def chat_endpoint(request: ChatRequest):
+    deadline = time.monotonic() + CHAT_DEADLINE_SECONDS
+    user_query = request.message
+    # Session files are read / fsynced off the event loop
+    conversation = await asyncio.to_thread(sessions.load, request.session_id)
+
+    # Follow-ups ("what about its fees?") are rewritten into a standalone retrieval query
+    retrieval_query = conversation.retrieval_query(user_query)
+    if retrieval_query != user_query:
+        print(f"Rewrote follow-up for retrieval: {retrieval_query!r}")
+
+    # Step 1: Speculatively start the scrape when the wording already asks for live info,
+    # so it runs at the same time as local retrieval instead of after it
+    started = time.perf_counter()
+    speculative = speculative_route(retrieval_query)
+    web_task = None
+    if speculative:
+        web_task = start_web_fetch(retrieval_query, speculative, deadline - GENERATION_RESERVE_SECONDS)
+    
+    # Step 1b: Check Local Context (Fast & Reliable)
+    ranked = await asyncio.to_thread(rank_documents, retrieval_query)
+
+    # Step 1c: FAQ shortcut - a near-exact question match is answered straight from the KB
+    shortcut = find_faq_shortcut(retrieval_query, ranked)
+    if shortcut:
+        cancel(web_task)
+        print(f"FAQ shortcut hit: {shortcut.get('id') or shortcut.get('question')}")
+        return await remember_turn(conversation, user_query, shortcut['answer'], shortcut=True)
+
+    local_context = find_relevant_context(retrieval_query, ranked)
+    history = conversation.history_prompt()
+    
+    # Step 2: Route - local only, live feed (notifications/exams) or full web search,
+    # based on how well the KB covers the query, its intent and what is already cached
+    decision = route_query(retrieval_query, ranked, live_feed)
+    if decision.route != speculative:
+        cancel(web_task)
+        web_task = None
+        if decision.route != "local":
+            web_task = start_web_fetch(retrieval_query, decision.route, deadline - GENERATION_RESERVE_SECONDS)
+
+    # Step 3: Wait for web context until the gathering budget runs out. If the site is slow,
+    # draft an answer from local context meanwhile so a late/missing scrape costs nothing extra.
+    gather_deadline = deadline - GENERATION_RESERVE_SECONDS
+    web_context = None
+    draft_task = None
+    if web_task is not None:
+        web_context = await wait_for_task(web_task, min(DRAFT_AFTER_SECONDS, max(0.0, gather_deadline - time.monotonic())))
+        if web_context is None and not web_task.done():
+            draft_task = asyncio.ensure_future(generate_answer(build_prompt(local_context, None, history, user_query), deadline))
+            web_context = await wait_for_task(web_task, max(0.0, gather_deadline - time.monotonic()))
+        if not web_task.done():
+            print("Web context missed the deadline; answering with local context")
+        cancel(web_task)
+    log_decision(retrieval_query, decision, (time.perf_counter() - started) * 1000)
+
+    # Step 4: Generate Response - with fresh web context if it arrived, else use the draft
+    answer = None
+    if web_context or draft_task is None:
+        final_task = asyncio.ensure_future(generate_answer(build_prompt(local_context, web_context, history, user_query), deadline))
+        answer = await wait_for_task(final_task, remaining(deadline))
+        cancel(final_task)
+    if answer is None and draft_task is not None:
+        answer = await wait_for_task(draft_task, remaining(deadline))
+    cancel(draft_task)
+
+    if answer is None:
+        # Not remembered: a transient outage shouldn't become part of the history
+        return {"response": f"**Network Unavailable**\n\nI tried to search the web but couldn't connect. Here is what I found locally:\n\n{local_context}", "shortcut": False, "session_id": conversation.session_id}
+    return await remember_turn(conversation, user_query, answer)
+
+async def remember_turn(conversation, user_query, answer, shortcut=False):
+    conversation.add_turn(user_query, answer)
+    try:
+        await asyncio.to_thread(sessions.save, conversation)
+    except OSError as e:
+        print(f"Failed to save conversation {conversation.session_id}: {e}")
+    return {"response": answer, "shortcut": shortcut, "session_id": conversation.session_id}
+
+# --- Probes ---
+
+@app.get("/health")
+def health():
+    # Liveness: the process is up; says nothing about the warm-ups
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    # Readiness: 503 until the KB snapshot, Gemini client and scraper libraries are loaded
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
 # --- Admin CRUD Endpoints ---
 
@@ -286,38 +557,41 @@ def get_faqs():
     data = load_data()
     return data.get("faqs", [])
 
+def next_faq_id(faqs):
+    # One past the highest faq-N in use, so deleted entries never hand out a live id again
+    numbers = [int(str(d.get('id'))[4:]) for d in faqs if re.fullmatch(r"faq-\d+", str(d.get('id')))]
+    return f"faq-{max(numbers, default=99) + 1}"
+
 @app.post("/api/faqs")
 def add_faq(faq: FAQItem):
-    data = load_data()
-    if "faqs" not in data:
-        data["faqs"] = []
-    
-    # Simple ID generation
-    new_id = f"faq-{len(data['faqs']) + 100}" # Avoid collisions with existing
-    new_entry = {
-        "id": new_id, 
-        "question": faq.question, 
-        "answer": faq.answer,
-        "category": faq.category or "General"
-    }
-    data["faqs"].append(new_entry)
-    save_data(data)
+    with kb_update() as data:
+        if "faqs" not in data:
+            data["faqs"] = []
+
+        new_id = next_faq_id(data["faqs"])
+        new_entry = {
+            "id": new_id, 
+            "question": faq.question, 
+            "answer": faq.answer,
+            "category": faq.category or "General"
+        }
+        data["faqs"].append(new_entry)
+        save_data(data)
     return {"message": "Success", "id": new_id}
 
 @app.delete("/api/faqs/{faq_id}")
 def delete_faq(faq_id: str):
-    data = load_data()
-    if "faqs" in data:
-        # Filter (handling both str and int IDs from legacy)
-        data["faqs"] = [d for d in data["faqs"] if str(d.get('id')) != str(faq_id)]
-        save_data(data)
+    with kb_update() as data:
+        if "faqs" in data:
+            # Filter (handling both str and int IDs from legacy)
+            data["faqs"] = [d for d in data["faqs"] if str(d.get('id')) != str(faq_id)]
+            save_data(data)
     return {"message": "Deleted"}
 
 @app.put("/api/faqs/{faq_id}")
 def update_faq(faq_id: str, faq: FAQItem):
-    data = load_data()
-    if "faqs" in data:
-        for item in data["faqs"]:
+    with kb_update() as data:
+        for item in data.get("faqs", []):
             if str(item.get('id')) == str(faq_id):
                 item['question'] = faq.question
                 item['answer'] = faq.answer
@@ -326,16 +600,18 @@ def update_faq(faq_id: str, faq: FAQItem):
                 return {"message": "Updated"}
     raise HTTPException(status_code=404, detail="Not found")
 
-# Serve Frontend with cache busting
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
-
-@app.middleware("http")
-async def add_no_cache_header(request, call_next):
-    response = await call_next(request)
-    if request.url.path in ["/script.js", "/style.css"]:
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    return response
+# Serve Frontend: fingerprinted, precompressed build of static/ (see static_assets.py).
+# Hashed assets are cached as immutable; index.html is revalidated so a deploy shows up at once.
+app.mount("/", static_app("static"), name="static")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8500)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 runs several worker processes; they share the KB through
+    # data.json and the live feed through SHARED_STATE_DIR (see shared_state.py).
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    host = os.getenv("HOST", "127.0.0.1")
+    port = int(os.getenv("PORT", "8500"))
+    if workers > 1:
+        uvicorn.run("main:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,229 @@
+import asyncio
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+
+from shared_state import atomic_write_bytes, state_path
+
+# Opt-in sampling profiler for live workers, mounted as ASGI middleware so it works
+# the same for main.app and app.main.app. Disabled unless PROFILING_TOKEN is set;
+# every use must send it in the X-Profile-Token header.
+#   GET /debug/profile?seconds=10&format=speedscope|collapsed[&idle=1]
+#       samples every thread of this worker for N seconds and returns the profile
+#   any request with "X-Profile: 1"
+#       samples while that request runs; the response carries X-Profile-Id and the
+#       profile is fetched from GET /debug/profile/<id> (from any worker)
+# Samples are wall-clock stacks of all threads, so concurrent requests show up too.
+# Open speedscope output at https://www.speedscope.app; collapsed stacks feed
+# flamegraph.pl / inferno directly.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_INTERVAL_SECONDS = float(os.getenv("PROFILING_INTERVAL_SECONDS", "0.005"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+PROFILES_TO_KEEP = 20
+
+PROFILE_PATH = "/debug/profile"
+PROFILE_ID_CHARS = set("0123456789abcdef")
+
+# Leaf frames of threads that are just waiting (event loop select, idle pool workers)
+IDLE_FRAMES = {
+    ("selectors.py", "select"), ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("thread.py", "_worker"), ("socket.py", "accept"), ("time.py", "sleep"),
+}
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Background thread recording the Python stack of every other thread at a fixed interval."""
+
+    def __init__(self, interval: float = PROFILING_INTERVAL_SECONDS, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's folded format: "root;caller;callee count"
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str) -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            ids = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({"name": label})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            }],
+            "name": name,
+            "exporter": "campus-assistant profiling.py",
+        }
+
+    def render(self, fmt: str, name: str):
+        if fmt == "collapsed":
+            return self.collapsed().encode("utf-8"), b"text/plain; charset=utf-8", "txt"
+        return json.dumps(self.speedscope(name)).encode("utf-8"), b"application/json", "speedscope.json"
+
+
+def profiles_dir():
+    directory = state_path("profiles")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def save_profile(profile_id: str, payload: bytes, ext: str):
+    directory = profiles_dir()
+    atomic_write_bytes(os.path.join(directory, f"{profile_id}.{ext}"), payload)
+    entries = sorted(os.scandir(directory), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[PROFILES_TO_KEEP:]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def load_profile(profile_id: str):
+    if not profile_id or not set(profile_id) <= PROFILE_ID_CHARS:
+        return None
+    for ext, content_type in (("speedscope.json", b"application/json"), ("txt", b"text/plain; charset=utf-8")):
+        try:
+            with open(os.path.join(profiles_dir(), f"{profile_id}.{ext}"), "rb") as f:
+                return f.read(), content_type
+        except FileNotFoundError:
+            continue
+    return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, token: str = PROFILING_TOKEN, app_name: str = "app"):
+        self.app = app
+        self.token = token
+        self.app_name = app_name
+        self._capture = asyncio.Lock()
+
+    def _authorized(self, headers) -> bool:
+        supplied = headers.get(b"x-profile-token", b"")
+        return bool(supplied) and hmac.compare_digest(supplied, self.token.encode("utf-8"))
+
+    async def __call__(self, scope, receive, send):
+        if not self.token or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        headers = dict(scope.get("headers", []))
+        if path == PROFILE_PATH or path.startswith(PROFILE_PATH + "/"):
+            if not self._authorized(headers):
+                return await respond(send, 403, b'{"detail": "Forbidden"}')
+            if path == PROFILE_PATH:
+                return await self._sample_worker(scope, send)
+            found = load_profile(path[len(PROFILE_PATH) + 1:])
+            if found is None:
+                return await respond(send, 404, b'{"detail": "Not found"}')
+            return await respond(send, 200, found[0], found[1])
+        if headers.get(b"x-profile") == b"1" and self._authorized(headers):
+            return await self._profile_request(scope, receive, send, headers)
+        return await self.app(scope, receive, send)
+
+    async def _sample_worker(self, scope, send):
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            seconds = min(float(query.get("seconds", ["10"])[0]), PROFILING_MAX_SECONDS)
+        except ValueError:
+            return await respond(send, 400, b'{"detail": "seconds must be a number"}')
+        fmt = query.get("format", ["speedscope"])[0]
+        if self._capture.locked():
+            return await respond(send, 409, b'{"detail": "A capture is already running in this worker"}')
+        async with self._capture:
+            sampler = StackSampler(include_idle=query.get("idle", ["0"])[0] == "1").start()
+            try:
+                await asyncio.sleep(max(0.0, seconds))
+            finally:
+                await asyncio.to_thread(sampler.stop)
+        payload, content_type, ext = sampler.render(fmt, f"{self.app_name} pid {os.getpid()} {seconds:g}s")
+        filename = f"profile-{os.getpid()}-{int(time.time())}.{ext}"
+        return await respond(send, 200, payload, content_type,
+                             [(b"content-disposition", f'attachment; filename="{filename}"'.encode())])
+
+    async def _profile_request(self, scope, receive, send, headers):
+        profile_id = uuid.uuid4().hex
+        fmt = "collapsed" if headers.get(b"x-profile-format") == b"collapsed" else "speedscope"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        sampler = StackSampler().start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            payload, _, ext = sampler.render(fmt, f"{scope.get('method')} {scope['path']} ({sampler.duration:.3f}s)")
+            try:
+                await asyncio.to_thread(save_profile, profile_id, payload, ext)
+            except OSError as e:
+                print(f"Failed to save profile {profile_id}: {e}")
+
+
+async def respond(send, status: int, body: bytes, content_type: bytes = b"application/json", extra_headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *extra_headers],
+    })
+    await send({"type": "http.response.body", "body": body})
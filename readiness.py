@@ -0,0 +1,96 @@
+import asyncio
+import os
+import time
+
+from fastapi import HTTPException
+
+# Startup gate shared by main.py and app/main.py. Heavy dependencies (Gemini
+# client, scraper libraries, embedding model / FAISS index, Mongo) are no longer
+# loaded at import time or before the lifespan yields; instead each one is a named
+# warm-up that runs in the background once the server is accepting connections:
+#   - /health (liveness) answers as soon as the process is up
+#   - /ready (readiness) returns 503 until every warm-up has succeeded, so the
+#     load balancer only routes traffic to a container once it is warm
+#   - routes that need a component await it via require(), for at most
+#     READINESS_WAIT_SECONDS, then return 503 with Retry-After
+# A failed warm-up (e.g. Mongo not up yet) is retried with backoff, capped at
+# READINESS_MAX_RETRY_SECONDS.
+READINESS_WAIT_SECONDS = float(os.getenv("READINESS_WAIT_SECONDS", "10"))
+READINESS_RETRY_SECONDS = float(os.getenv("READINESS_RETRY_SECONDS", "1"))
+READINESS_MAX_RETRY_SECONDS = float(os.getenv("READINESS_MAX_RETRY_SECONDS", "30"))
+
+
+class Readiness:
+    def __init__(self):
+        self.checks = {} # name -> {"state": "pending" | "ok" | "error", "seconds", "error", "attempts"}
+        self._warmups = {}
+        self._events = {}
+        self._tasks = []
+        self.started_at = time.monotonic()
+
+    def add(self, name: str, warm):
+        """Registers a warm-up: a coroutine function, or a blocking callable (run in a thread)."""
+        self._warmups[name] = warm
+        self._events[name] = asyncio.Event()
+        self.checks[name] = {"state": "pending", "seconds": None, "error": None, "attempts": 0}
+
+    def start(self):
+        # Called from the lifespan: the warm-ups run while the server is already serving /health
+        self.started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._run(name)) for name in self._warmups]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, name: str):
+        warm = self._warmups[name]
+        check = self.checks[name]
+        delay = READINESS_RETRY_SECONDS
+        while True:
+            check["attempts"] += 1
+            try:
+                if asyncio.iscoroutinefunction(warm):
+                    await warm()
+                else:
+                    await asyncio.to_thread(warm)
+            except Exception as e:
+                check.update(state="error", error=repr(e))
+                print(f"Warm-up {name!r} failed (attempt {check['attempts']}), retrying in {delay:.0f}s: {e!r}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, READINESS_MAX_RETRY_SECONDS)
+                continue
+            check.update(state="ok", error=None, seconds=round(time.monotonic() - self.started_at, 3))
+            self._events[name].set()
+            return
+
+    def is_ready(self, *names) -> bool:
+        return all(self._events[name].is_set() for name in (names or self._events))
+
+    async def wait(self, *names, timeout: float = READINESS_WAIT_SECONDS) -> bool:
+        events = [self._events[name] for name in (names or self._events)]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(e.wait() for e in events)), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def require(self, *names, timeout: float = READINESS_WAIT_SECONDS):
+        """Waits for the named components; 503 + Retry-After if they aren't up in time."""
+        if self.is_ready(*names) or await self.wait(*names, timeout=timeout):
+            return
+        pending = [n for n in (names or self.checks) if self.checks[n]["state"] != "ok"]
+        raise HTTPException(
+            status_code=503,
+            detail=f"Warming up: {', '.join(pending)}",
+            headers={"Retry-After": str(max(1, int(READINESS_RETRY_SECONDS)))},
+        )
+
+    def report(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "checks": self.checks,
+        }
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import threading
+import time
+
+from conversation import keywords
+
+# Decides, per chat message, where context comes from:
+#   "local"     - the KB answers it; no network at all
+#   "live_feed" - notifications / exam circulars (background feed, or a direct page scrape if stale)
+#   "web"       - Google site: search + page fetches, the slow path
+# Decisions are logged as one JSON line each so latency per route can be measured.
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CONFIDENCE_THRESHOLD", "0.6"))
+WEB_CACHE_TTL_SECONDS = float(os.getenv("WEB_CACHE_TTL_SECONDS", "1800"))
+WEB_CACHE_MAX_ENTRIES = 512
+
+# Phrases that ask for time-sensitive information only the live site has
+LIVE_INTENT_PATTERNS = [
+    r"\blatest\b", r"\bnews\b", r"\bnotifications?\b", r"\bupdates?\b", r"\bcirculars?\b",
+    r"\bresults?\b", r"\btime ?table\b", r"\bschedule\b", r"\bhall ?tickets?\b",
+    r"\btoday\b", r"\bthis (week|month)\b", r"\blast date\b", r"\bdeadline\b", r"\bannounce",
+    r"\b20\d\d\b",
+]
+LIVE_INTENT_RE = re.compile("|".join(LIVE_INTENT_PATTERNS))
+
+
+class RouteDecision:
+    def __init__(self, route: str, reason: str, coverage: float, live_intent: bool, categories):
+        self.route = route
+        self.reason = reason
+        self.coverage = coverage
+        self.live_intent = live_intent
+        self.categories = categories
+
+
+def stem(token: str) -> str:
+    # Crude suffix stripping so "hostels"/"located" match "hostel"/"location"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def local_coverage(query: str, ranked) -> float:
+    """
+    Share of the query's topic words (stopwords removed) found in the best local
+    match, 0.0 - 1.0. Unlike the raw keyword score this doesn't reward "what is the".
+    """
+    topic = {stem(t) for t in keywords(query)}
+    if not ranked:
+        return 0.0
+    if not topic:
+        return 1.0
+    best = 0.0
+    for _, _, entry in ranked[:5]: # the same top 5 find_relevant_context sends
+        text = f"{entry.get('question', '')} {entry.get('answer', '')}".lower()
+        best = max(best, sum(1 for t in topic if t in text) / len(topic))
+    return best
+
+
+def classify_live_intent(query: str) -> bool:
+    return LIVE_INTENT_RE.search(query.lower()) is not None
+
+
+def route_query(query: str, ranked, feed) -> RouteDecision:
+    coverage = local_coverage(query, ranked)
+    live_intent = classify_live_intent(query)
+    categories = feed.categories_for(query)
+
+    if live_intent and categories:
+        return RouteDecision("live_feed", "live-info intent for a feed category", coverage, live_intent, categories)
+    if coverage >= LOCAL_CONFIDENCE_THRESHOLD and not live_intent:
+        return RouteDecision("local", f"local coverage {coverage:.2f}", coverage, live_intent, categories)
+    if web_cache.get(query) is not None:
+        return RouteDecision("web", "cached web result", coverage, live_intent, categories)
+    if live_intent:
+        return RouteDecision("web", "live-info intent without a feed category", coverage, live_intent, categories)
+    return RouteDecision("web", f"low local coverage {coverage:.2f}", coverage, live_intent, categories)
+
+
+def log_decision(query: str, decision: RouteDecision, context_ms: float):
+    print("route " + json.dumps({
+        "route": decision.route,
+        "reason": decision.reason,
+        "coverage": round(decision.coverage, 2),
+        "live_intent": decision.live_intent,
+        "context_ms": round(context_ms, 1),
+        "query_len": len(query),
+    }))
+
+
+class TTLCache:
+    """Small per-worker cache of web search results keyed on the normalized query."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get(self, query: str):
+        with self._lock:
+            item = self._items.get(self._key(query))
+        if item is None or time.time() - item[0] > self.ttl:
+            return None
+        return item[1]
+
+    def set(self, query: str, value):
+        with self._lock:
+            if len(self._items) >= self.max_entries:
+                oldest = min(self._items, key=lambda k: self._items[k][0])
+                del self._items[oldest]
+            self._items[self._key(query)] = (time.time(), value)
+
+
+web_cache = TTLCache(WEB_CACHE_TTL_SECONDS, WEB_CACHE_MAX_ENTRIES)
@@ -1,27 +1,36 @@
 import requests
-from bs4 import BeautifulSoup
 import json
 import os
 import time
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-
-if not api_key:
-    print("Error: GOOGLE_API_KEY not found in .env file.")
-    exit()
+from faq_generation import FAQGenerator, Page, configure_genai
+from crawl_frontier import CrawlFrontier, canonical_url, parse_page, parse_sitemap
+from shared_state import KB_WRITE_LOCK, FileLock, atomic_write_json, state_path
 
-genai.configure(api_key=api_key)
+# Load environment variables (Gemini is configured by FAQGenerator, on first use)
+load_dotenv()
 
 # Configuration
 DATA_FILE = "data.json"
 MODEL_NAME = "gemini-1.5-flash" # Standard efficient model
 # Fallback model if flash fails
 FALLBACK_MODEL = "gemini-pro"
+FETCH_CONCURRENCY = 4
+SAVE_EVERY_PAGES = 5
+# Pages fetched per run; the frontier decides which (new pages first, then the most overdue)
+CRAWL_BUDGET = int(os.getenv("CRAWL_BUDGET", "100"))
+SITE_ROOT = "https://svuniversity.edu.in/"
+SITE_DOMAIN = "svuniversity.edu.in"
+SITEMAP_URLS = [SITE_ROOT + "sitemap.xml", SITE_ROOT + "sitemap_index.xml", SITE_ROOT + "wp-sitemap.xml"]
+MAX_SITEMAPS = 50
 
+# One connection pool for every page fetch
+session = requests.Session()
+session.headers.update({'User-Agent': 'Mozilla/5.0'})
+
+# Known important pages, used as extra crawl seeds next to the sitemap and home page
 urls_to_scrape = [
     # HOME & BASIC PAGES
     "https://svuniversity.edu.in/",
@@ -139,25 +148,63 @@ urls_to_scrape = [
     "https://svuniversity.edu.in/dvv/"
 ]
 
-def get_page_text(url):
+def fetch(url):
+    # Verify=False for SVU website certificate issues
+    response = session.get(url, verify=False, timeout=15)
+    response.raise_for_status()
+    return response
+
+def crawl_page(url):
+    """(text, links, canonical URL, error) for one frontier URL."""
     try:
-        # Verify=False for SVU website certificate issues
-        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, verify=False, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove scripts and styles
+        response = fetch(url)
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None, [], None, f"not html: {response.headers.get('Content-Type')}"
+        canonical, links, soup = parse_page(response.text, response.url)
+
+        # Remove scripts and styles (after collecting links, so menus still feed discovery)
         for script in soup(["script", "style", "nav", "footer"]):
             script.decompose()
-            
+
         # Get text
         text = soup.get_text(separator=' ', strip=True)
         # Clean up whitespace
         text = ' '.join(text.split())
-        return text[:10000] # Limit context window
+        return text[:10000], links, canonical, None # Limit context window
     except Exception as e:
         print(f"Failed to fetch {url}: {e}")
-        return None
+        return None, [], None, str(e)
+
+def seed_frontier(frontier, processed_urls, processed_at):
+    # Sitemaps listed in robots.txt plus the usual WordPress locations; sitemap indexes are followed
+    sitemaps = list(SITEMAP_URLS)
+    try:
+        for line in fetch(SITE_ROOT + "robots.txt").text.splitlines():
+            if line.lower().startswith("sitemap:"):
+                sitemaps.insert(0, line.split(":", 1)[1].strip())
+    except Exception as e:
+        print(f"No robots.txt: {e}")
+    seen = set()
+    added = 0
+    while sitemaps and len(seen) < MAX_SITEMAPS:
+        sitemap = sitemaps.pop(0)
+        if sitemap in seen:
+            continue
+        seen.add(sitemap)
+        try:
+            entries, children = parse_sitemap(fetch(sitemap).content)
+        except Exception:
+            continue
+        sitemaps.extend(children)
+        added += frontier.add_sitemap_entries(entries)
+    print(f"Sitemaps: {len(seen)} read, {added} URLs")
+
+    frontier.add(SITE_ROOT, depth=0)
+    for url in urls_to_scrape:
+        frontier.add(url, depth=1)
+    # Pages that already have FAQs from earlier runs aren't treated as new
+    for url in processed_urls:
+        frontier.mark_known(url, processed_at)
 
 def classify_category(question, answer):
     text = (question + " " + answer).lower()
@@ -177,51 +224,17 @@ def classify_category(question, answer):
         return "General Info"
     return "Other"
 
-def generate_faqs(text, url):
-    model = genai.GenerativeModel(MODEL_NAME)
-    prompt = f"""
-    Analyze the following text scraped from {url} of Sri Venkateswara University.
-    Extract key facts, dates, names, roles, and procedures.
-    Generate 5 to 10 high-quality Question-Answer pairs (FAQs) based ONLY on this text.
-    Format the output as a JSON array of objects, where each object has "question" and "answer" keys.
-    Do not add any markdown formatting like ```json. just return the raw JSON array.
-    
-    Text:
-    {text}
-    """
-    
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            content = response.text.strip()
-            # Clean markdown if present
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-                
-            faqs = json.loads(content)
-            # Add categorization immediately
-            for faq in faqs:
-                faq['category'] = classify_category(faq.get('question',''), faq.get('answer',''))
-            return faqs
-            
-        except Exception as e:
-            if "429" in str(e) or "quota" in str(e).lower():
-                wait_time = (attempt + 1) * 10
-                print(f"  !! Rate limit hit. Waiting {wait_time}s before retry {attempt+1}/{max_retries}...")
-                time.sleep(wait_time)
-            else:
-                print(f"Error generating FAQS for {url}: {e}")
-                return []
-    
-    print(f"  !! Failed to generate FAQs for {url} after {max_retries} retries.")
-    return []
+def update_database(new_faqs, replaced_sources=()):
+    # Same lock as the admin FAQ endpoints (main.kb_update), so neither overwrites the other's edits
+    lock = FileLock(state_path(KB_WRITE_LOCK))
+    while not lock.try_acquire():
+        time.sleep(0.05)
+    try:
+        _update_database(new_faqs, replaced_sources)
+    finally:
+        lock.release()
 
-def update_database(new_faqs):
+def _update_database(new_faqs, replaced_sources):
     if not os.path.exists(DATA_FILE):
         data = {"faqs": []}
     else:
@@ -233,7 +246,15 @@ def update_database(new_faqs):
     
     if "faqs" not in data:
         data["faqs"] = []
-    
+
+    # A page that changed gets fresh FAQs: drop the generated ones from its previous version
+    replaced_sources = set(replaced_sources)
+    if replaced_sources:
+        data["faqs"] = [
+            item for item in data["faqs"]
+            if not (str(item.get("id", "")).startswith("auto-") and canonical_url(item.get("source") or "") in replaced_sources)
+        ]
+
     # Check for duplicates based on question
     existing_questions = {ftp['question'].lower() for ftp in data["faqs"] if 'question' in ftp}
     
@@ -248,15 +269,20 @@ def update_database(new_faqs):
         data["faqs"].append(faq)
         added_count += 1
         
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    # Atomic replace: the API workers rebuild their KB snapshot from whatever data.json holds
+    atomic_write_json(DATA_FILE, data, indent=2)
     print(f"Updates saved to {DATA_FILE} (+{added_count} new)")
 
 def main():
+    # Fail on a missing API key before crawling, not after the frontier has recorded the fetches
+    configure_genai()
+
     # Load existing processed URLs
     processed_urls = set()
+    processed_at = time.time()
     if os.path.exists(DATA_FILE):
         try:
+            processed_at = os.path.getmtime(DATA_FILE)
             with open(DATA_FILE, 'r') as f:
                 data = json.load(f)
                 if "faqs" in data:
@@ -267,42 +293,58 @@ def main():
         except Exception as e:
             print(f"Error loading existing data: {e}")
 
-    print(f"Starting scraping of {len(urls_to_scrape)} URLs...")
-    
+    frontier = CrawlFrontier.load(SITE_DOMAIN)
+    seed_frontier(frontier, processed_urls, processed_at)
+    urls = frontier.next_batch(CRAWL_BUDGET)
+    print(f"Crawling {len(urls)} of {len(frontier.pages)} known URLs (budget {CRAWL_BUDGET})...")
+
+    # Fetch pages in parallel; only new or changed content goes on to FAQ generation
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as pool:
+        results = list(pool.map(crawl_page, urls))
+    pages = []
+    statuses = {}
+    for url, (text, links, canonical, error) in zip(urls, results):
+        status = frontier.record_fetch(url, text, links, canonical, error)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "changed" and text:
+            pages.append(Page(url, text))
+        elif status == "changed":
+            # Nothing to generate FAQs from: skipped on purpose, not retried
+            frontier.commit([url])
+    # Changed pages are saved with their old state until their FAQs are stored below
+    frontier.save()
+    print(f"Fetched: {statuses}; {len(frontier.pages)} URLs in the frontier.")
+
+    generator = FAQGenerator(MODEL_NAME)
     batch_faqs = []
+    batch_sources = set()
     total_generated = 0
-    
-    for i, url in enumerate(urls_to_scrape):
-        if url in processed_urls:
-            print(f"[{i+1}/{len(urls_to_scrape)}] Skipping {url} (Already processed)")
-            continue
+    done = 0
 
-        print(f"[{i+1}/{len(urls_to_scrape)}] Processing {url}...")
-        text = get_page_text(url)
-        if text:
-            print(f"  - Content extracted ({len(text)} chars). Generating FAQs...")
-            faqs = generate_faqs(text, url)
-            if faqs:
-                print(f"  - Generated {len(faqs)} FAQs.")
-                for faq in faqs:
-                   faq['source'] = url
-                batch_faqs.extend(faqs)
-                total_generated += len(faqs)
-            else:
-                print("  - No FAQs generated.")
-            
-            # Rate limiting
-            time.sleep(2) 
+    for page, faqs in generator.generate(pages):
+        done += 1
+        if faqs:
+            print(f"[{done}/{len(pages)}] {page.url}: {len(faqs)} FAQs")
+            for faq in faqs:
+                faq['category'] = classify_category(faq['question'], faq['answer'])
+                faq['source'] = page.url
+            batch_faqs.extend(faqs)
+            batch_sources.add(page.url)
+            total_generated += len(faqs)
         else:
-            print("  - Skipping.")
+            print(f"[{done}/{len(pages)}] {page.url}: no FAQs generated")
 
-        # Save every 5 URLs or if it's the last one
-        if len(batch_faqs) > 0 and ((i + 1) % 5 == 0 or (i + 1) == len(urls_to_scrape)):
-             print(f"  >> Saving batch of {len(batch_faqs)} FAQs to database...")
-             update_database(batch_faqs)
-             batch_faqs = [] # Reset batch
+        # Save every few pages so an interrupted run keeps its progress
+        if batch_faqs and (done % SAVE_EVERY_PAGES == 0 or done == len(pages)):
+            print(f"  >> Saving batch of {len(batch_faqs)} FAQs to database...")
+            update_database(batch_faqs, batch_sources)
+            # Only now is the new content "seen": pages without FAQs stay due for the next run
+            frontier.commit(batch_sources)
+            frontier.save()
+            batch_faqs = [] # Reset batch
+            batch_sources = set()
 
-    print(f"Completed! Total new FAQs generated: {total_generated}")
+    print(f"Completed! Total new FAQs generated: {total_generated} with {generator.calls} model calls")
 
 if __name__ == "__main__":
     # Suppress SSL warnings
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError: # Windows: no flock, single-worker dev setups only
+    fcntl = None
+
+# State shared between uvicorn workers lives on the local filesystem:
+# - writers replace files atomically, readers reload when the file signature changes
+# - background jobs that must run once per host are guarded by an exclusive lock file
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", ".shared_state")
+# Held (in SHARED_STATE_DIR) by every read-modify-write of data.json: the admin
+# FAQ endpoints in each worker and the crawler (scrape_and_update_kb.py)
+KB_WRITE_LOCK = "kb_write.lock"
+
+
+def state_path(name: str) -> str:
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+    return os.path.join(SHARED_STATE_DIR, name)
+
+
+def file_signature(path: str):
+    # Changes whenever the file is replaced or rewritten; None if it doesn't exist
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write_bytes(path: str, payload: bytes):
+    # Write to a temp file in the same directory, then rename over the target so
+    # readers in other workers never see a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data, indent=None):
+    atomic_write_bytes(path, json.dumps(data, indent=indent).encode("utf-8"))
+
+
+class FileLock:
+    """
+    Non-blocking, process-wide exclusive lock. The OS releases it when the
+    holding worker exits, so another worker can take over on its next attempt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
+
+    def try_acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        if fcntl is None:
+            self._fh = True
+            return True
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is None:
+            return
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._fh.close()
+        self._fh = None
+
+
+class SharedJSONFile:
+    """
+    Read-through cache of a JSON file that other workers may replace.
+    get() only re-parses the file when its signature has changed.
+    """
+
+    def __init__(self, path: str, default=None):
+        self.path = path
+        self.default = default
+        self._signature = None
+        self._value = default
+
+    def get(self):
+        signature = file_signature(self.path)
+        if signature != self._signature:
+            value = self.default
+            if signature is not None:
+                try:
+                    with open(self.path, "r") as f:
+                        value = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Failed to load shared state {self.path}: {e}")
+                    return self._value
+            self._value = value
+            self._signature = signature
+        return self._value
+
+    def set(self, value, indent=None):
+        atomic_write_json(self.path, value, indent=indent)
+        self._value = value
+        self._signature = file_signature(self.path)
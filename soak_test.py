@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Soak test for the chat endpoint (main.py) against the offline fault-injection
+# stand-ins (fault_injection.py): sends a mix of FAQ, live-feed and web-search
+# questions for a while and reports tail latency and error rates, overall and
+# per question kind, plus the faults that were injected. Exit status 1 when a
+# --max-* threshold is exceeded, so a run can gate a change to the deadlines /
+# fallbacks:
+#   python soak_test.py --profile slow_site --duration 60 --concurrency 8
+#   python soak_test.py --profile chaos --requests 400 --rate 4 --max-p99-ms 15000 --max-error-rate 0.05
+#   python soak_test.py --url http://localhost:8500 --duration 60   # a server started with FAULT_INJECTION set
+# In-process runs use a throwaway SHARED_STATE_DIR, lift the chat admission limits
+# (one client sends everything) and turn the web cache off unless --keep-web-cache.
+
+LIVE_QUESTIONS = [
+    "latest exam notifications", "any new circulars this week", "exam time table for degree courses",
+    "when are the revaluation results announced", "latest notifications about admission counselling",
+    "hall tickets for the upcoming exams",
+]
+WEB_QUESTIONS = [
+    "what is the fee for MBA admission", "how do I apply for a hostel room", "library opening hours",
+    "phd admission eligibility criteria", "contact details of the examinations branch",
+    "scholarships available for postgraduate students",
+]
+DEFAULT_MIX = "faq=0.4,live=0.3,web=0.3"
+DEGRADED_PREFIX = "**Network Unavailable**"
+
+
+async def faq_questions(client):
+    """The FAQ questions in the server's own KB, so the "faq" kind exercises its shortcut path."""
+    try:
+        res = await client.get("/api/faqs")
+        faqs = res.json() if res.status_code == 200 else []
+    except Exception:
+        faqs = []
+    return [faq["question"] for faq in faqs if isinstance(faq, dict) and faq.get("question")]
+
+
+def parse_mix(spec: str):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"faq", "live", "web"}
+    if unknown:
+        raise SystemExit(f"Unknown question kinds in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values, pct: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def classify(status: int, body) -> str:
+    if status in (429, 503):
+        return "rejected"
+    if status != 200 or not isinstance(body, dict):
+        return "error"
+    if body.get("shortcut"):
+        return "shortcut"
+    if str(body.get("response", "")).startswith(DEGRADED_PREFIX):
+        return "degraded"
+    return "answered"
+
+
+def summarize(results, elapsed: float):
+    """results: [(kind, outcome, latency ms)]"""
+    def block(rows):
+        latencies = sorted(ms for _, _, ms in rows)
+        outcomes = {}
+        for _, outcome, _ in rows:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        failed = sum(outcomes.get(o, 0) for o in ("error", "rejected", "degraded"))
+        return {
+            "requests": len(rows),
+            "error_rate": round(failed / len(rows), 4) if rows else 0.0,
+            "outcomes": outcomes,
+            "latency_ms": {name: round(percentile(latencies, pct), 1) if latencies else None
+                           for name, pct in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("p99.9", 99.9), ("max", 100))},
+        }
+
+    report = {"elapsed_seconds": round(elapsed, 2), "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0}
+    report.update(block(results))
+    report["by_kind"] = {kind: block([r for r in results if r[0] == kind]) for kind in sorted({r[0] for r in results})}
+    return report
+
+
+def print_report(report: dict, profile: str):
+    print(f"\nprofile {profile}: {report['requests']} requests in {report['elapsed_seconds']}s ({report['throughput_rps']} req/s)")
+    header = f"{'':10}{'n':>6}{'err%':>8}" + "".join(f"{name:>10}" for name in report["latency_ms"])
+    print(header)
+    rows = [("all", report)] + list(report["by_kind"].items())
+    for name, block in rows:
+        cells = "".join(f"{(v if v is not None else '-'):>10}" for v in block["latency_ms"].values())
+        print(f"{name:10}{block['requests']:>6}{block['error_rate'] * 100:>7.1f}%{cells}")
+    print("outcomes: " + ", ".join(f"{k} {v}" for k, v in sorted(report["outcomes"].items())))
+    for dependency, counts in report.get("injected", {}).items():
+        print(f"injected {dependency}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+
+async def run_load(client, questions, mix, args):
+    if mix.get("faq") and not questions.get("faq"):
+        questions["faq"] = await faq_questions(client)
+        if not questions["faq"]:
+            print("warning: the server's KB has no FAQs, skipping the faq kind", file=sys.stderr)
+    rng = random.Random(args.seed)
+    kinds = [k for k in mix if questions.get(k)]
+    weights = [mix[k] for k in kinds]
+    results = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    stop_at = started + args.duration
+
+    async def one(scheduled: float):
+        kind = rng.choices(kinds, weights)[0]
+        message = rng.choice(questions[kind])
+        async with semaphore:
+            try:
+                res = await client.post("/api/chat", json={"message": message}, timeout=args.timeout)
+                try:
+                    body = res.json()
+                except ValueError:
+                    body = None
+                outcome = classify(res.status_code, body)
+            except Exception as e:
+                outcome = "error"
+                if args.verbose:
+                    print(f"client error: {e!r}", file=sys.stderr)
+        # Measured from when the request was due, so a backed-up server isn't hidden (open loop)
+        results.append((kind, outcome, (time.perf_counter() - scheduled) * 1000))
+
+    def done(sent: int) -> bool:
+        return (args.requests and sent >= args.requests) or (not args.requests and time.perf_counter() >= stop_at)
+
+    tasks = []
+    sent = 0
+    if args.rate:
+        # Open loop: fixed arrival rate whatever the latency
+        while not done(sent):
+            scheduled = started + sent / args.rate
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(one(scheduled)))
+            sent += 1
+        await asyncio.gather(*tasks)
+    else:
+        # Closed loop: `concurrency` clients, each sending its next question when the last one returns
+        counter = {"sent": 0}
+
+        async def worker():
+            while not done(counter["sent"]):
+                counter["sent"] += 1
+                await one(time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results, time.perf_counter() - started
+
+
+async def wait_until_ready(client, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return True
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def soak(args, questions, mix):
+    import httpx
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            if not await wait_until_ready(client, args.ready_timeout):
+                raise SystemExit(f"{args.url} did not become ready within {args.ready_timeout}s")
+            results, elapsed = await run_load(client, questions, mix, args)
+        return summarize(results, elapsed)
+
+    import main
+    from fault_injection import get_injector
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://soak") as client:
+            if not await wait_until_ready(client, args.ready_timeout):
+                raise SystemExit(f"main.py did not become ready within {args.ready_timeout}s")
+            results, elapsed = await run_load(client, questions, mix, args)
+    report = summarize(results, elapsed)
+    report["injected"] = get_injector().stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test /api/chat against injected Gemini / website faults.")
+    parser.add_argument("--profile", default=os.getenv("FAULT_INJECTION") or "chaos",
+                        help="Fault profile: preset name or JSON file (in-process runs; default chaos)")
+    parser.add_argument("--url", help="Soak a running server instead of main.py in-process")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients (closed loop) / max in flight (with --rate)")
+    parser.add_argument("--rate", type=float, default=0, help="Open loop: requests per second")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Question kinds and weights (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=60, help="Client-side request timeout in seconds")
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=None, help="Seeds the question picks and the injected faults")
+    parser.add_argument("--keep-web-cache", action="store_true", help="Leave the web search cache on (in-process)")
+    parser.add_argument("--server-log", default=os.devnull, help="Where the in-process server's output goes")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if overall p99 latency exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the error + rejected + degraded share exceeds this")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    questions = {"live": LIVE_QUESTIONS, "web": WEB_QUESTIONS}
+
+    if not args.url:
+        # Must be set before main / fault_injection are imported
+        os.environ["FAULT_INJECTION"] = args.profile
+        if args.seed is not None:
+            os.environ.setdefault("FAULT_INJECTION_SEED", str(args.seed))
+        os.environ.setdefault("SHARED_STATE_DIR", tempfile.mkdtemp(prefix="soak-state-"))
+        for name, value in (("RATE_PER_MINUTE", "1000000"), ("BURST", "1000000"), ("CONCURRENCY", "1000"), ("QUEUE", "1000")):
+            os.environ.setdefault(f"ADMISSION_CHAT_{name}", value)
+        if not args.keep_web_cache:
+            os.environ.setdefault("WEB_CACHE_TTL_SECONDS", "0")
+
+    with open(args.server_log, "a") as log, contextlib.redirect_stdout(log):
+        report = asyncio.run(soak(args, questions, mix))
+    report["profile"] = args.url or args.profile
+
+    print_report(report, report["profile"])
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.max_p99_ms is not None and (report["latency_ms"]["p99"] or 0) > args.max_p99_ms:
+        failures.append(f"p99 {report['latency_ms']['p99']} ms > {args.max_p99_ms} ms")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -54,6 +54,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
 // Chat History State
 let chatHistory = JSON.parse(localStorage.getItem('svu_chat_history') || '[]');
+// Server-side conversation id (lets the backend resolve follow-up questions)
+let sessionId = localStorage.getItem('svu_session_id');
 
 function loadChatHistory() {
     if (chatHistory.length > 0 && welcomeScreen) {
@@ -106,12 +108,17 @@ async function sendMessage() {
         const response = await fetch(`${API_URL}/chat`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message: text })
+            body: JSON.stringify({ message: text, session_id: sessionId })
         });
 
         if (!response.ok) throw new Error('Backend unavailable');
         const data = await response.json();
 
+        if (data.session_id && data.session_id !== sessionId) {
+            sessionId = data.session_id;
+            localStorage.setItem('svu_session_id', sessionId);
+        }
+
         // Hide typing indicator before showing response
         hideTypingIndicator();
 
@@ -271,6 +278,8 @@ function clearChat() {
     // Clear History
     chatHistory = [];
     localStorage.removeItem('svu_chat_history');
+    sessionId = null;
+    localStorage.removeItem('svu_session_id');
 
     // Reset to welcome state
     // Remove all messages except welcome screen and typing indicator
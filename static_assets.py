@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError: # optional: without it only gzip variants are built
+    brotli = None
+
+# Build step for the frontend in static/:
+#   - every asset except index.html gets a content-hashed copy (script.3f9c2a71d0.js)
+#   - references in index.html / CSS / JS are rewritten to the hashed names
+#   - text assets get .gz (and .br when brotli is installed) siblings, compressed once
+# Each build goes to STATIC_BUILD_DIR/<source digest>/, so workers starting together
+# share one build and a changed static/ simply produces a new directory.
+# Hashed files never change, so they are served with a one-year immutable
+# Cache-Control; index.html and the original names are revalidated on every load.
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", "static_build")
+MANIFEST_FILE = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+BUILDS_TO_KEEP = 2 # the previous build keeps serving workers that haven't restarted yet
+
+ENTRY_POINTS = {"index.html", "404.html"}
+REWRITE_EXTENSIONS = {".html", ".css", ".js"}
+COMPRESS_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt", ".map"}
+MIN_COMPRESS_BYTES = 512
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def list_assets(source_dir: str):
+    assets = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            assets.append(os.path.relpath(path, source_dir).replace(os.sep, "/"))
+    return assets
+
+
+def source_digest(source_dir: str) -> str:
+    digest = hashlib.sha256()
+    for rel in list_assets(source_dir):
+        digest.update(rel.encode("utf-8") + b"\0")
+        with open(os.path.join(source_dir, rel), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def hashed_name(rel: str, payload: bytes) -> str:
+    base, ext = os.path.splitext(rel)
+    return f"{base}.{hashlib.sha256(payload).hexdigest()[:10]}{ext}"
+
+
+def rewrite_references(text: str, manifest) -> str:
+    # "script.js?v=2" / "images/logo.svg" -> hashed name; the ?v= cache buster is no longer needed
+    for original, hashed in manifest.items():
+        pattern = r"(?<![\w./-])" + re.escape(original) + r"(?:\?v=[\w.-]*)?(?![\w/-])"
+        text = re.sub(pattern, hashed, text)
+    return text
+
+
+def compress_variants(path: str, payload: bytes):
+    if os.path.splitext(path)[1] not in COMPRESS_EXTENSIONS or len(payload) < MIN_COMPRESS_BYTES:
+        return
+    variants = {".gz": gzip.compress(payload, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(payload, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(payload):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+def build_assets(source_dir: str, output_dir: str):
+    """
+    Writes the fingerprinted, precompressed copy of source_dir into output_dir and
+    returns the manifest {original name: hashed name}.
+    """
+    assets = list_assets(source_dir)
+    contents = {}
+    for rel in assets:
+        with open(os.path.join(source_dir, rel), "rb") as f:
+            contents[rel] = f.read()
+
+    # Leaf assets (images, fonts) first, then CSS/JS, whose hashes depend on the
+    # rewritten references they contain, and the entry points last.
+    def order(rel):
+        ext = os.path.splitext(rel)[1]
+        return (rel in ENTRY_POINTS, ext in REWRITE_EXTENSIONS, rel)
+
+    manifest = {}
+    for rel in sorted(assets, key=order):
+        payload = contents[rel]
+        if os.path.splitext(rel)[1] in REWRITE_EXTENSIONS:
+            payload = rewrite_references(payload.decode("utf-8"), manifest).encode("utf-8")
+        names = [rel]
+        if rel not in ENTRY_POINTS:
+            manifest[rel] = hashed_name(rel, payload)
+            names.append(manifest[rel])
+        # The original name stays available for anything that still links to it
+        for name in names:
+            path = os.path.join(output_dir, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(payload)
+            compress_variants(path, payload)
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def ensure_built(source_dir: str = "static", build_root: str = STATIC_BUILD_DIR):
+    """
+    Returns the build directory for the current contents of source_dir, building
+    it first if needed. Returns None if it can't be built (e.g. read-only disk),
+    so the caller can fall back to serving source_dir as it is.
+    """
+    try:
+        target = os.path.join(build_root, source_digest(source_dir))
+        if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+            return target
+        os.makedirs(build_root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=build_root, prefix=".tmp-")
+        try:
+            manifest = build_assets(source_dir, tmp_dir)
+            # Another worker may finish the same build first; either copy is identical
+            os.rename(tmp_dir, target)
+            print(f"Built static assets in {target} ({len(manifest)} fingerprinted files)")
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(target, MANIFEST_FILE)):
+                raise
+        prune_builds(build_root, keep=target)
+        return target
+    except OSError as e:
+        print(f"Static asset build failed, serving {source_dir} unprocessed: {e}")
+        return None
+
+
+def prune_builds(build_root: str, keep: str):
+    builds = [e for e in os.scandir(build_root) if e.is_dir() and not e.name.startswith(".")
+              and os.path.abspath(e.path) != os.path.abspath(keep)]
+    builds.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in builds[BUILDS_TO_KEEP - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def accepted_encodings(scope):
+    accepted = set()
+    for part in Headers(scope=scope).get("accept-encoding", "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles over a build directory: serves the .br / .gz sibling when the client
+    accepts it, marks fingerprinted files immutable and everything else no-cache.
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), "r") as f:
+                self.immutable = set(json.load(f).values())
+        except (OSError, json.JSONDecodeError):
+            self.immutable = set()
+        self.root = os.path.abspath(directory)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        full_path = str(full_path)
+        rel = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if rel in self.immutable else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        accepted = accepted_encodings(scope)
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(full_path + suffix):
+                full_path = full_path + suffix
+                stat_result = os.stat(full_path)
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def static_app(source_dir: str = "static", build_root: str = STATIC_BUILD_DIR):
+    build_dir = ensure_built(source_dir, build_root)
+    # Unbuilt fallback: no manifest, so every file is served with no-cache
+    return PrecompressedStaticFiles(directory=build_dir or source_dir, html=True)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "static"
+    root = sys.argv[2] if len(sys.argv) > 2 else STATIC_BUILD_DIR
+    build = ensure_built(source, root)
+    if build is None:
+        sys.exit(1)
+    print(f"Static assets ready in {build}")
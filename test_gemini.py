@@ -1,31 +1,36 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=api_key)
+def main():
+    import google.generativeai as genai
 
-print("Listing available models:")
-try:
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"- {m.name}")
-except Exception as e:
-    print(f"Error listing models: {e}")
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    genai.configure(api_key=api_key)
 
-print("\nTesting generation with 'gemini-1.5-flash'...")
-try:
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content("Hello")
-    print(f"Success! Response: {response.text}")
-except Exception as e:
-    print(f"Failed with 'gemini-1.5-flash': {e}")
+    print("Listing available models:")
+    try:
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                print(f"- {m.name}")
+    except Exception as e:
+        print(f"Error listing models: {e}")
 
-print("\nTesting generation with 'models/gemini-1.5-flash'...")
-try:
-    model = genai.GenerativeModel('models/gemini-1.5-flash')
-    response = model.generate_content("Hello")
-    print(f"Success! Response: {response.text}")
-except Exception as e:
-    print(f"Failed with 'models/gemini-1.5-flash': {e}")
+    print("\nTesting generation with 'gemini-1.5-flash'...")
+    try:
+        model = genai.GenerativeModel('gemini-1.5-flash')
+        response = model.generate_content("Hello")
+        print(f"Success! Response: {response.text}")
+    except Exception as e:
+        print(f"Failed with 'gemini-1.5-flash': {e}")
+
+    print("\nTesting generation with 'models/gemini-1.5-flash'...")
+    try:
+        model = genai.GenerativeModel('models/gemini-1.5-flash')
+        response = model.generate_content("Hello")
+        print(f"Success! Response: {response.text}")
+    except Exception as e:
+        print(f"Failed with 'models/gemini-1.5-flash': {e}")
+
+if __name__ == "__main__":
+    main()
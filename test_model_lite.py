@@ -1,16 +1,21 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=api_key)
+def main():
+    import google.generativeai as genai
 
-model_name = "models/gemini-2.5-flash-lite"
-print(f"Testing {model_name}...")
-try:
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content("Hello")
-    print(f"Success! Response: {response.text}")
-except Exception as e:
-    print(f"Failed: {e}")
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    genai.configure(api_key=api_key)
+
+    model_name = "models/gemini-2.5-flash-lite"
+    print(f"Testing {model_name}...")
+    try:
+        model = genai.GenerativeModel(model_name)
+        response = model.generate_content("Hello")
+        print(f"Success! Response: {response.text}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+if __name__ == "__main__":
+    main()